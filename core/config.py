@@ -20,6 +20,90 @@ class Settings(BaseSettings):
     IMPORT_FROM_S3_PASSWORD: Optional[str] = None
     DEBUG: bool = False
 
+    # Предрасчитанная очередь кандидатов ленты
+    FEED_QUEUE_ENABLED: bool = True
+    FEED_QUEUE_SIZE: int = 200
+    FEED_QUEUE_REFILL_AT: int = 60
+    FEED_QUEUE_ACTIVE_TTL_SECONDS: int = 1800
+    FEED_QUEUE_MAX_ACTIVE: int = 50_000  # сколько активных пользователей помнит один воркер
+    FEED_QUEUE_REDIS_URL: Optional[str] = None  # общий бэкенд для нескольких воркеров
+
+    # Веса ранжирования ленты (см. services/feed_ranking.py)
+    FEED_RANK_WEIGHT_RECENCY: float = 1.0
+    FEED_RANK_WEIGHT_PHOTOS: float = 0.3
+    FEED_RANK_WEIGHT_POPULARITY: float = 0.5
+    FEED_RANK_SEEN_PENALTY: float = 1.5
+    FEED_RANK_RECENCY_HALF_LIFE_HOURS: float = 72.0
+    FEED_RANK_SEEN_HALF_LIFE_HOURS: float = 24.0
+    FEED_RANK_POOL_FACTOR: int = 5  # доливка ранжирует пул в N раз больше недостающего
+    FEED_EXCLUDE_SEEN_HOURS: float = 0  # 0 — просмотренные анкеты не скрываются
+
+    # Лента по расстоянию (sort=distance)
+    FEED_DEFAULT_RADIUS_KM: float = 50.0
+    FEED_PROXIMITY_RINGS: int = 4  # на сколько колец ячеек geohash делится радиус поиска
+
+    # Баттлы: пакетная запись исходов и рейтинг Эло
+    BATTLE_FLUSH_BATCH: int = 500
+    BATTLE_FLUSH_INTERVAL_SECONDS: float = 2.0
+    BATTLE_ELO_K: float = 32.0
+    BATTLE_POOL_TTL_SECONDS: int = 600
+    BATTLE_PAIR_SAMPLE_SIZE: int = 8
+    BATTLE_LEADERBOARD_RECONCILE_SECONDS: int = 900
+    BATTLE_PAIR_TOKEN_TTL_SECONDS: int = 600  # сколько действителен токен показанной пары
+    BATTLE_PAIR_TOKEN_CACHE_SIZE: int = 100_000
+
+    # Write-behind буфер просмотров анкет
+    VIEW_BUFFER_MAX_SIZE: int = 10_000
+    VIEW_BUFFER_BATCH_SIZE: int = 500
+    VIEW_BUFFER_FLUSH_SECONDS: float = 1.0
+
+    # Кэш топа по лайкам (/interactions/top)
+    TOP_CACHE_SIZE: int = 20
+    TOP_CACHE_REFRESH_SECONDS: float = 30.0
+
+    # Диспетчер уведомлений в Telegram
+    NOTIFY_MAX_PENDING_CHATS: int = 10_000
+    NOTIFY_GLOBAL_RATE: float = 25.0  # сообщений в секунду на весь бот (лимит Telegram ~30)
+    NOTIFY_PER_CHAT_PER_MINUTE: float = 2.0
+    NOTIFY_PER_CHAT_BURST: int = 3
+    NOTIFY_COALESCE_SECONDS: float = 3.0
+    NOTIFY_MAX_ATTEMPTS: int = 3
+    NOTIFY_FLUSH_SECONDS: float = 1.0  # как часто очередь уведомлений пишется в pending_notifications
+    NOTIFY_STALE_SECONDS: float = 60.0  # строку без обновлений дольше этого забирает другой процесс
+
+    # Кэш пользователей в get_current_user
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+
+    # Межворкерная инвалидация кэшей через LISTEN/NOTIFY
+    INVALIDATION_BUS_ENABLED: bool = True
+    INVALIDATION_BUS_PING_SECONDS: float = 30.0
+
+    # Кэш проверенных Telegram init_data
+    INIT_DATA_CACHE_SIZE: int = 10_000
+    INIT_DATA_MAX_REUSE: int = 20  # сколько раз можно повторно предъявить тот же init_data
+
+    # Пул процессов для обработки фото
+    IMAGE_POOL_WORKERS: int = 0  # 0 — по числу ядер
+    IMAGE_POOL_MAX_IN_FLIGHT: int = 8
+    IMAGE_POOL_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    PHOTO_UPLOAD_CONCURRENCY: int = 3  # фото одного запроса, обрабатываемые одновременно
+
+    # Лимиты загрузок
+    MAX_PHOTOS: int = 6  # фото на пользователя
+    UPLOAD_MAX_FILE_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_MAX_REQUEST_BYTES: int = 130 * 1024 * 1024  # до 6 фото в одном запросе
+    S3_PART_SIZE: int = 5 * 1024 * 1024  # минимальный размер части multipart в S3
+
+    # Прямая загрузка в S3 по подписанной форме
+    PRESIGNED_UPLOAD_EXPIRE_SECONDS: int = 900
+    S3_STAGING_BUCKET: Optional[str] = None  # приватный бакет для исходников; по умолчанию — основной
+    PHOTO_STAGING_MAX_AGE_SECONDS: int = 86_400  # брошенные исходники и статусы загрузок старше — удаляются
+    PHOTO_STAGING_CLEANUP_SECONDS: int = 3600
+    PHOTO_INGEST_STALE_SECONDS: int = 600  # «processing» дольше — задание потеряно, можно подтвердить снова
+    PHOTO_INGEST_WORKERS: int = 2
+    PHOTO_INGEST_QUEUE_SIZE: int = 100
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -7,8 +7,12 @@ TYPE_POSTFIX = {
     "likes": 4,
     "matches": 5,
     "feed_views": 6,
+    "battles": 7,
 }
 
+# Все случайные id меньше этого значения; id из последовательностей выдаются выше
+RANDOM_ID_CEILING = 100_000_000
+
 
 def generate_random_id(entity: str) -> int:
     """Возвращает 8-значный id: 6 случайных цифр + 2-значный постфикс."""
@@ -1,21 +1,30 @@
 # core/security.py
 import hmac
 import hashlib
-from datetime import datetime, timedelta
+import time
 from urllib.parse import parse_qsl
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy import select
+from sqlalchemy import select, inspect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from starlette import status
 
+from core.cache import TTLCache
 from core.config import settings
 from core.database import get_db
 from models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth")
 
+# Снимки пользователей (значения колонок) по id для get_current_user
+user_cache: TTLCache[int, dict] = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+)
+_USER_COLUMNS = inspect(User).column_attrs
+
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
@@ -45,31 +54,114 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        # Кэш-попадание обходится без запроса и без взятия соединения из пула
+        return await _attach_snapshot(db, snapshot)
+
     stmt = select(User).where(User.id == user_id)
     result = await db.execute(stmt)
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    user_cache.set(user_id, _snapshot(user))
     return user
 
 
+def _snapshot(user: User) -> dict:
+    return {attr.key: getattr(user, attr.key) for attr in _USER_COLUMNS}
+
+
+async def _attach_snapshot(db: AsyncSession, snapshot: dict) -> User:
+    """
+    Восстанавливает User из снимка и присоединяет к сессии запроса как уже
+    загруженный (merge с load=False не ходит в базу): обработчики могут
+    менять его и коммитить как обычно.
+    """
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+def invalidate_user(user_id: int) -> None:
+    """Сбрасывает кэшированный снимок после изменения профиля."""
+    user_cache.invalidate(user_id)
+
+
+# Ключ подписи initData зависит только от токена бота — считаем один раз
+_WEBAPP_SECRET = hmac.new(
+    key=b"WebAppData",
+    msg=settings.TELEGRAM_BOT_TOKEN.encode("utf-8"),
+    digestmod=hashlib.sha256,
+).digest()
+
+
+class _VerifiedInitData:
+    __slots__ = ("data", "uses")
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.uses = 1
+
+
+# Уже проверенные init_data по sha256 от исходной строки
+_init_data_cache: TTLCache[bytes, _VerifiedInitData] = TTLCache(
+    maxsize=settings.INIT_DATA_CACHE_SIZE,
+    ttl=86_400,
+)
+
+
 def verify_init_data(init_data: str, max_age_seconds: int = 86_400) -> dict:
     """
     Проверяет подпись Telegram.WebApp.initData и возвращает словарь всех параметров,
     кроме hash. Бросает HTTPException(403), если подпись не совпадает,
+    init_data устарел или предъявлен больше INIT_DATA_MAX_REUSE раз повторно,
     или (400), если формат данных неверен.
 
     Алгоритм в соответствии с рекомендациями Telegram:
     1. parse_qsl → dict (авто-decode percent-encoding)
     2. извлечь hash и убрать из dict
     3. собрать data_check_string: отсортированные пары "key=value" через "\n"
-    4. secret_key = HMAC-SHA256(key=b"WebAppData", msg=BOT_TOKEN)
+    4. secret_key = HMAC-SHA256(key=b"WebAppData", msg=BOT_TOKEN) — считается один раз
     5. calculated_hash = HMAC-SHA256(key=secret_key, msg=data_check_string).hexdigest()
     6. сравнить calculated_hash и hash_received
     7. проверить, что auth_date не старее max_age_seconds (по желанию)
+
+    Успешно проверенный init_data кэшируется до истечения max_age_seconds:
+    повторы (ретраи мини-аппа) не разбираются и не подписываются заново.
     """
-    data_list = parse_qsl(init_data, keep_blank_values=True)
-    data = dict(data_list)
+    cache_key = hashlib.sha256(init_data.encode("utf-8")).digest()
+    cached = _init_data_cache.get(cache_key)
+    if cached is not None:
+        if cached.uses > settings.INIT_DATA_MAX_REUSE:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="init_data already used"
+            )
+        cached.uses += 1
+        return dict(cached.data)
+
+    data = _check_init_data(init_data)
+
+    ttl = float(max_age_seconds)
+    auth_date = data.get("auth_date")
+    if auth_date and auth_date.isdigit():
+        age = time.time() - int(auth_date)
+        if age > max_age_seconds:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="init_data is too old"
+            )
+        # Запись живёт ровно до момента, когда init_data устареет
+        ttl = max_age_seconds - age
+
+    _init_data_cache.set(cache_key, _VerifiedInitData(data), ttl=ttl)
+    return dict(data)
+
+
+def _check_init_data(init_data: str) -> dict:
+    """Разбор и проверка подписи без кэша."""
+    data = dict(parse_qsl(init_data, keep_blank_values=True))
 
     hash_received = data.pop("hash", None)
     if not hash_received:
@@ -78,17 +170,9 @@ def verify_init_data(init_data: str, max_age_seconds: int = 86_400) -> dict:
             detail="Missing 'hash' in init_data"
         )
 
-    data_check_arr = [f"{key}={data[key]}" for key in sorted(data.keys())]
-    data_check_string = "\n".join(data_check_arr)
-
-    secret_key = hmac.new(
-        key=b"WebAppData",
-        msg=settings.TELEGRAM_BOT_TOKEN.encode("utf-8"),
-        digestmod=hashlib.sha256
-    ).digest()
-
+    data_check_string = "\n".join(f"{key}={data[key]}" for key in sorted(data))
     computed_hash = hmac.new(
-        key=secret_key,
+        key=_WEBAPP_SECRET,
         msg=data_check_string.encode("utf-8"),
         digestmod=hashlib.sha256
     ).hexdigest()
@@ -98,15 +182,4 @@ def verify_init_data(init_data: str, max_age_seconds: int = 86_400) -> dict:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid init_data signature"
         )
-
-    auth_date = data.get("auth_date")
-    if auth_date and auth_date.isdigit():
-        ts = int(auth_date)
-        dt = datetime.utcfromtimestamp(ts)
-        if datetime.utcnow() - dt > timedelta(seconds=max_age_seconds):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="init_data is too old"
-            )
-
-    return data
\ No newline at end of file
+    return data
@@ -7,8 +7,12 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from core.config import settings
 from core.database import engine
+from core.security import user_cache
 from models.base import Base
 from utils.drop_db import async_drop_database
+from utils.db_upgrades import apply_schema_upgrades
+from utils.pagination import NEXT_CURSOR_HEADER
+from utils.upload_limits import UploadSizeLimitMiddleware
 
 from routers.auth import router as auth_router
 from routers.user import router as user_router
@@ -20,7 +24,16 @@ from routers.health import router as health_router
 from routers.admin import router as admin_router
 from routers.location import router as location_router
 
-from services.telegram_bot import start_bot, bot
+from services.telegram_bot import start_bot, bot, notifications
+from services.feed_queue import feed_engine
+from services.battle_recorder import battle_recorder
+from services.battle_pool import battle_pool, decode_location_key
+from services.battle_leaderboard import battle_leaderboard
+from services.view_buffer import view_buffer
+from services.top_cache import top_liked_cache
+from services.invalidation_bus import invalidation_bus
+from services.image_pool import image_processor
+from services.photo_ingest import photo_ingest
 
 app = FastAPI(
     title="Luvo MiniApp Backend",
@@ -34,10 +47,16 @@ app.add_middleware(
     allow_credentials=True,     # Если используете куки или авторизацию
     allow_methods=["*"],        # GET, POST, PATCH и т.д.
     allow_headers=["*"],        # Content-Type, Authorization и др.
+    expose_headers=[NEXT_CURSOR_HEADER],  # Курсор пагинации должен быть виден фронтенду
 )
+# Слишком большие загрузки отклоняются до разбора формы
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
 
 logger = logging.getLogger("uvicorn.error")
 
+# Фоновые задачи приложения, которые нужно остановить при shutdown
+background_tasks: list[asyncio.Task] = []
+
 
 @app.middleware("http")
 async def log_request_time(request: Request, call_next):
@@ -66,8 +85,27 @@ async def on_startup():
     # Сначала создаём все таблицы
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await apply_schema_upgrades(conn)
 
     asyncio.create_task(start_bot())
+    background_tasks.append(asyncio.create_task(feed_engine.run()))
+    background_tasks.append(asyncio.create_task(battle_recorder.run()))
+    background_tasks.append(asyncio.create_task(battle_leaderboard.run()))
+    background_tasks.append(asyncio.create_task(view_buffer.run()))
+    background_tasks.append(asyncio.create_task(top_liked_cache.run()))
+    background_tasks.append(asyncio.create_task(notifications.run()))
+    background_tasks.append(asyncio.create_task(photo_ingest.run()))
+
+    invalidation_bus.register("user", lambda key: user_cache.invalidate(int(key)), user_cache.clear)
+    invalidation_bus.register("feed", lambda key: feed_engine.invalidate(int(key)), feed_engine.clear_local)
+    invalidation_bus.register(
+        "battle_pool", lambda key: battle_pool.drop_district(decode_location_key(key)), battle_pool.clear
+    )
+    invalidation_bus.register(
+        "battle_leaderboard", lambda key: battle_leaderboard.drop(decode_location_key(key)), battle_leaderboard.clear
+    )
+    invalidation_bus.register("top", lambda key: top_liked_cache.invalidate(int(key)), top_liked_cache.clear)
+    background_tasks.append(asyncio.create_task(invalidation_bus.run()))
 
 @app.get("/")
 async def root():
@@ -75,6 +113,11 @@ async def root():
 
 @app.on_event("shutdown")
 async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    image_processor.shutdown()
+
     await bot.session.close()
     # Закрываем все соединения пула
     await engine.dispose()
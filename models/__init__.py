@@ -1,8 +1,11 @@
 from .battle import Battle  # noqa: F401
+from .battle_rating import BattleRating  # noqa: F401
 from .feed_view import FeedView  # noqa: F401
 from .instagram_connection import InstagramConnection  # noqa: F401
 from .instagram_data import InstagramData  # noqa: F401
 from .like import Like  # noqa: F401
 from .match import Match  # noqa: F401
+from .pending_notification import PendingNotification  # noqa: F401
 from .photo import Photo  # noqa: F401
+from .photo_upload import PhotoUpload  # noqa: F401
 from .user import User  # noqa: F401
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -11,9 +11,17 @@ class Battle(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     opponent_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    winner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"))
+    winner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    # Район, в котором сыгран баттл: по нему считается лидерборд
+    country = Column(String(64), nullable=True)
+    city = Column(String(64), nullable=True)
+    district = Column(String(128), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("ix_battles_location_winner", "country", "city", "district", "winner_id"),
+    )
+
     user = relationship("User", foreign_keys=[user_id])
     opponent = relationship("User", foreign_keys=[opponent_id])
     winner = relationship("User", foreign_keys=[winner_id])
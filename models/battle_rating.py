@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+from .base import Base
+
+# Стартовый рейтинг Эло для пользователя без сыгранных баттлов
+DEFAULT_RATING = 1500.0
+
+
+class BattleRating(Base):
+    __tablename__ = "battle_ratings"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    rating = Column(Float, default=DEFAULT_RATING, nullable=False)
+    games = Column(Integer, default=0, nullable=False)
+    wins = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    user = relationship("User")
+
+    def __repr__(self) -> str:
+        return f"<BattleRating user_id={self.user_id} rating={self.rating:.0f}>"
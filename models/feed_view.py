@@ -1,5 +1,5 @@
 # backend/models/feed_view.py
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -7,15 +7,22 @@ from .base import Base
 
 
 class FeedView(Base):
+    """Агрегат просмотров: одна строка на пару (viewer, viewed)."""
+
     __tablename__ = "feed_views"
+    __table_args__ = (
+        UniqueConstraint("viewer_id", "viewed_id", name="uq_feed_views_viewer_viewed"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     viewer_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     viewed_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    view_count = Column(Integer, nullable=False, server_default="1")
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # первый просмотр
+    last_viewed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     viewer = relationship("User", foreign_keys=[viewer_id], backref="viewed_profiles")
     viewed = relationship("User", foreign_keys=[viewed_id], backref="viewed_by")
 
     def __repr__(self):
-        return f"<FeedView {self.viewer_id}→{self.viewed_id}>"
+        return f"<FeedView {self.viewer_id}→{self.viewed_id} ×{self.view_count}>"
@@ -1,5 +1,5 @@
 # backend/models/like.py
-from sqlalchemy import Column, Integer, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -17,6 +17,13 @@ class Like(Base):
     # Добавляем новое поле is_ignored
     is_ignored = Column(Boolean, default=False, nullable=False)
 
+    __table_args__ = (
+        # Один лайк на пару; индекс же обслуживает анти-join ленты по liker_id
+        UniqueConstraint("liker_id", "liked_id", name="uq_likes_liker_liked"),
+        # Входящие лайки пользователя (популярность в ранжировании ленты)
+        Index("ix_likes_liked_created", "liked_id", "created_at"),
+    )
+
     liker = relationship("User", foreign_keys=[liker_id], backref="likes_given")
     liked = relationship("User", foreign_keys=[liked_id], backref="likes_received")
 
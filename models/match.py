@@ -1,5 +1,5 @@
 # backend/models/match.py
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -14,6 +14,15 @@ class Match(Base):
     user2_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        # Пара хранится упорядоченной (user1_id < user2_id), поиск идёт с обеих сторон
+        UniqueConstraint("user1_id", "user2_id", name="uq_matches_user1_user2"),
+        Index("ix_matches_user2_user1", "user2_id", "user1_id"),
+        # Список матчей пользователя от свежих к старым, по индексу на каждую сторону
+        Index("ix_matches_user1_created", "user1_id", "created_at", "id"),
+        Index("ix_matches_user2_created", "user2_id", "created_at", "id"),
+    )
+
     user1 = relationship("User", foreign_keys=[user1_id], backref="matches_as_user1")
     user2 = relationship("User", foreign_keys=[user2_id], backref="matches_as_user2")
 
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, BigInteger, DateTime
+from sqlalchemy.sql import func
+
+from .base import Base
+
+
+class PendingNotification(Base):
+    """
+    Неотправленные уведомления. Диспетчер дописывает сюда каждое уведомление
+    и вычитает отправленные; updated_at — отметка живого владельца очереди.
+    """
+
+    __tablename__ = "pending_notifications"
+
+    chat_id = Column(BigInteger, primary_key=True)
+    likes = Column(Integer, default=0, nullable=False)
+    matches = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<PendingNotification chat_id={self.chat_id} likes={self.likes} matches={self.matches}>"
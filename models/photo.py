@@ -1,6 +1,6 @@
 # backend/models/photos.py
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false
 from sqlalchemy.orm import relationship
 
 from .base import Base
@@ -10,9 +10,11 @@ class Photo(Base):
     __tablename__ = "photos"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     s3_key = Column(String(length=255), nullable=False)
     is_general = Column(Boolean, default=True, nullable=False)
+    # Есть ли в S3 размерные варианты thumb/card (utils.s3.variant_key)
+    has_variants = Column(Boolean, default=False, server_default=false(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Связь с Profile (если понадобится)
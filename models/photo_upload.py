@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy.sql import func
+
+from .base import Base
+
+# Статусы загрузки по подписанной форме
+UPLOAD_PROCESSING = "processing"  # подтверждена, ждёт или проходит обработку
+UPLOAD_DONE = "done"              # фото создано, photo_id заполнен
+UPLOAD_REJECTED = "rejected"      # не изображение или лимит фото; исходник удалён
+UPLOAD_FAILED = "failed"          # временный сбой; исходник цел, можно подтвердить снова
+
+
+class PhotoUpload(Base):
+    """
+    Подтверждённая загрузка в staging: строка «захватывает» ключ, чтобы один
+    и тот же исходник не обработался дважды, и хранит статус обработки.
+    """
+
+    __tablename__ = "photo_uploads"
+
+    staging_key = Column(String(length=255), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(length=16), nullable=False, default=UPLOAD_PROCESSING)
+    photo_id = Column(Integer, ForeignKey("photos.id", ondelete="SET NULL"), nullable=True)
+    error = Column(String(length=255), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<PhotoUpload key={self.staging_key} status={self.status}>"
@@ -1,5 +1,5 @@
 # backend/models/user.py
-from sqlalchemy import Column, Integer, BigInteger, DateTime, Boolean, String, Text, Date, Float
+from sqlalchemy import Column, Integer, BigInteger, DateTime, Boolean, String, Text, Date, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
@@ -22,11 +22,22 @@ class User(Base):
     telegram_username = Column(String(64), nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    # geohash точки (utils.geo); побайтовая сортировка "C" нужна для range-сканов по префиксу
+    geohash = Column(String(12, collation="C"), nullable=True, index=True)
     country = Column(String(64), nullable=True)
     city = Column(String(64), nullable=True)
     district = Column(String(128), nullable=True)
+    # Денормализованный счётчик входящих лайков, ведётся repos.likes.toggle_like
+    likes_received_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
+    __table_args__ = (
+        # Ключ keyset-пагинации ленты: ORDER BY created_at DESC, id DESC
+        Index("ix_users_created_at_id", "created_at", "id"),
+        # Топ по лайкам: ORDER BY likes_received_count DESC, id DESC
+        Index("ix_users_likes_received", "likes_received_count", "id"),
+    )
+
     def __repr__(self):
         return f"<User id={self.id} telegram_id={self.telegram_user_id}>"
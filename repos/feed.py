@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+from sqlalchemy import Select, select, tuple_, func, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.user import User
+from models.like import Like as LikeModel
+from models.match import Match as MatchModel
+from models.photo import Photo
+from models.feed_view import FeedView
+from utils.geo import haversine_km, precision_for_radius, ring_cells, ring_radius_km
+
+
+def opposite_gender(gender: Optional[str]) -> Optional[str]:
+    """Какой пол показывать в ленте; None — без фильтра."""
+    if gender == "male":
+        return "female"
+    if gender == "female":
+        return "male"
+    return None
+
+
+def feed_candidates_stmt(viewer_id: int, viewer_gender: Optional[str]) -> Select:
+    """
+    Базовый запрос кандидатов ленты без сортировки и лимита.
+
+    Анти-join'ы (NOT EXISTS) исключают лайкнутых, заматченных и, если задан
+    FEED_EXCLUDE_SEEN_HOURS, недавно просмотренных.
+    Каждый из них — точечный поиск по составному индексу пары.
+    """
+    liked = select(LikeModel.id).where(
+        LikeModel.liker_id == viewer_id,
+        LikeModel.liked_id == User.id,
+    ).exists()
+    matched_as_user2 = select(MatchModel.id).where(
+        MatchModel.user2_id == viewer_id,
+        MatchModel.user1_id == User.id,
+    ).exists()
+    matched_as_user1 = select(MatchModel.id).where(
+        MatchModel.user1_id == viewer_id,
+        MatchModel.user2_id == User.id,
+    ).exists()
+    stmt = select(User).where(
+        User.id != viewer_id,
+        ~liked,
+        ~matched_as_user2,
+        ~matched_as_user1,
+    )
+
+    if settings.FEED_EXCLUDE_SEEN_HOURS > 0:
+        # Точечный поиск по uq_feed_views_viewer_viewed
+        recently_seen = select(FeedView.id).where(
+            FeedView.viewer_id == viewer_id,
+            FeedView.viewed_id == User.id,
+            FeedView.last_viewed_at > func.now() - timedelta(hours=settings.FEED_EXCLUDE_SEEN_HOURS),
+        ).exists()
+        stmt = stmt.where(~recently_seen)
+
+    wanted_gender = opposite_gender(viewer_gender)
+    if wanted_gender is not None:
+        stmt = stmt.where(User.gender == wanted_gender)
+    return stmt
+
+
+def newest_first(stmt: Select, after: Optional[tuple[datetime, int]] = None) -> Select:
+    """Сортировка ленты (created_at, id) DESC с keyset-продолжением после after."""
+    if after is not None:
+        stmt = stmt.where(tuple_(User.created_at, User.id) < after)
+    return stmt.order_by(User.created_at.desc(), User.id.desc())
+
+
+async def fetch_candidate_features(
+    db: AsyncSession,
+    viewer_id: int,
+    viewer_gender: Optional[str],
+    limit: int,
+    after: Optional[tuple[datetime, int]] = None,
+) -> list[tuple[int, datetime, int, int, Optional[datetime]]]:
+    """
+    Пачка кандидатов с признаками для ранжирования:
+    (id, created_at, число фото, число лайков, когда viewer последний раз видел анкету).
+    """
+    photo_count = (
+        select(func.count(Photo.id))
+        .where(Photo.user_id == User.id)
+        .scalar_subquery()
+    )
+    last_viewed_at = (
+        select(FeedView.last_viewed_at)
+        .where(FeedView.viewer_id == viewer_id, FeedView.viewed_id == User.id)
+        .scalar_subquery()
+    )
+    base = feed_candidates_stmt(viewer_id, viewer_gender)
+    stmt = newest_first(
+        base.with_only_columns(User.id, User.created_at, photo_count, User.likes_received_count, last_viewed_at),
+        after,
+    ).limit(limit)
+    result = await db.execute(stmt)
+    return [tuple(row) for row in result.all()]
+
+
+async def load_candidates(
+    db: AsyncSession,
+    viewer_id: int,
+    viewer_gender: Optional[str],
+    ids: Sequence[int],
+) -> list[User]:
+    """
+    Загружает пользователей по списку id в том же порядке, повторно применяя
+    фильтры ленты — на случай, если очередь успела устареть.
+    """
+    if not ids:
+        return []
+    stmt = feed_candidates_stmt(viewer_id, viewer_gender).where(User.id.in_(ids))
+    result = await db.execute(stmt)
+    by_id = {u.id: u for u in result.scalars().all()}
+    return [by_id[uid] for uid in ids if uid in by_id]
+
+
+async def fetch_nearby_candidates(
+    db: AsyncSession,
+    viewer_id: int,
+    viewer_gender: Optional[str],
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    limit: int,
+    after: Optional[tuple[float, int]] = None,
+) -> list[tuple[User, float]]:
+    """
+    Ближайшие кандидаты в радиусе radius_km по (расстояние, id), строго после after.
+
+    Радиус делится на FEED_PROXIMITY_RINGS ячеек geohash; поиск идёт кольцами
+    ячеек от точки наружу, каждое кольцо — range-сканы индекса users.geohash,
+    читаются только id и координаты. Расширение останавливается, как только
+    limit кандидатов лежат внутри гарантированно покрытого круга или он
+    дорос до radius_km. Полные строки загружаются только для страницы.
+    """
+    precision = precision_for_radius(latitude, radius_km / settings.FEED_PROXIMITY_RINGS)
+    base = feed_candidates_stmt(viewer_id, viewer_gender).with_only_columns(
+        User.id, User.latitude, User.longitude
+    )
+    found: list[tuple[float, int]] = []
+    scanned: set[str] = set()
+    ring = 0
+    while True:
+        cells = ring_cells(latitude, longitude, precision, ring) - scanned
+        scanned |= cells
+        if cells:
+            in_cells = or_(*[
+                and_(User.geohash >= cell, User.geohash < cell + "~")
+                for cell in sorted(cells)
+            ])
+            for user_id, user_lat, user_lon in (await db.execute(base.where(in_cells))).all():
+                if user_lat is None or user_lon is None:
+                    continue
+                key = (haversine_km(latitude, longitude, user_lat, user_lon), user_id)
+                if key[0] <= radius_km and (after is None or key > after):
+                    found.append(key)
+
+        covered = ring_radius_km(latitude, precision, ring)
+        if covered >= radius_km or (ring > 0 and not cells):
+            # Новых ячеек нет только когда кольца уже охватили весь шар
+            break
+        if sum(1 for distance, _ in found if distance <= covered) >= limit:
+            break
+        ring += 1
+
+    found.sort()
+    page = found[:limit]
+    users = await load_candidates(db, viewer_id, viewer_gender, [user_id for _, user_id in page])
+    distances = {user_id: distance for distance, user_id in page}
+    return [(user, distances[user.id]) for user in users]
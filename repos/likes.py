@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from datetime import datetime
+
+from sqlalchemy import Select, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.like import Like as LikeModel
+from models.match import Match as MatchModel
+from models.user import User
+
+# Сериализует лайки внутри одной пары: без этого два встречных лайка,
+# поставленные одновременно, не видят друг друга и матч не создаётся.
+_LOCK_PAIR = text("SELECT pg_advisory_xact_lock(:lock_key)")
+
+# Переключение лайка и детекция матча одним выражением.
+# removed/unmatched — ветка «убрать лайк», added/mutual/matched — «поставить»,
+# counted — счётчик users.likes_received_count в той же транзакции.
+_TOGGLE_LIKE = text("""
+    WITH removed AS (
+        DELETE FROM likes
+        WHERE liker_id = :liker_id AND liked_id = :liked_id
+        RETURNING id
+    ),
+    unmatched AS (
+        DELETE FROM matches
+        WHERE user1_id = :user1_id AND user2_id = :user2_id
+          AND EXISTS (SELECT 1 FROM removed)
+        RETURNING id
+    ),
+    added AS (
+        INSERT INTO likes (liker_id, liked_id, is_ignored, created_at)
+        SELECT :liker_id, :liked_id, false, now()
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (liker_id, liked_id) DO NOTHING
+        RETURNING id
+    ),
+    mutual AS (
+        SELECT 1 FROM likes
+        WHERE liker_id = :liked_id AND liked_id = :liker_id
+          AND NOT EXISTS (SELECT 1 FROM removed)
+    ),
+    matched AS (
+        INSERT INTO matches (user1_id, user2_id, created_at)
+        SELECT :user1_id, :user2_id, now()
+        WHERE EXISTS (SELECT 1 FROM added) AND EXISTS (SELECT 1 FROM mutual)
+        ON CONFLICT (user1_id, user2_id) DO NOTHING
+        RETURNING id
+    ),
+    counted AS (
+        UPDATE users
+        SET likes_received_count = GREATEST(
+            likes_received_count
+            + (SELECT count(*) FROM added)
+            - (SELECT count(*) FROM removed),
+            0
+        )
+        WHERE id = :liked_id
+          AND (EXISTS (SELECT 1 FROM added) OR EXISTS (SELECT 1 FROM removed))
+        RETURNING telegram_user_id
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM removed) AS unliked,
+        EXISTS (SELECT 1 FROM mutual) AS mutual,
+        EXISTS (SELECT 1 FROM matched) AS match_created,
+        (SELECT telegram_user_id FROM users WHERE id = :liked_id) AS liked_telegram_id
+""")
+
+
+@dataclass(frozen=True)
+class LikeToggle:
+    liked: bool
+    mutual: bool
+    match_created: bool
+    liked_telegram_id: Optional[int]
+
+
+def _pair_lock_key(user1_id: int, user2_id: int) -> int:
+    """Ключ advisory-lock пары в диапазоне signed bigint."""
+    return (user1_id * 1_000_000_007 + user2_id) % (1 << 63)
+
+
+async def toggle_like(db: AsyncSession, liker_id: int, liked_id: int) -> LikeToggle:
+    """
+    Ставит лайк, если его нет, иначе убирает (вместе с матчем пары).
+
+    Ровно два выражения в одной транзакции: advisory-lock пары и CTE.
+    Повторный конкурентный лайк упирается в uq_likes_liker_liked
+    и становится no-op, дубликаты матчей отсекает uq_matches_user1_user2.
+    Счётчик лайков получателя меняется только при реальной вставке/удалении.
+    id лайка и матча берутся из последовательностей (см. utils/db_upgrades.py).
+    Транзакцию фиксирует вызывающий код.
+    """
+    user1_id, user2_id = sorted((liker_id, liked_id))
+    await db.execute(_LOCK_PAIR, {"lock_key": _pair_lock_key(user1_id, user2_id)})
+    row = (await db.execute(
+        _TOGGLE_LIKE,
+        {
+            "liker_id": liker_id,
+            "liked_id": liked_id,
+            "user1_id": user1_id,
+            "user2_id": user2_id,
+        },
+    )).one()
+    return LikeToggle(
+        liked=not row.unliked,
+        mutual=row.mutual,
+        match_created=row.match_created,
+        liked_telegram_id=row.liked_telegram_id,
+    )
+
+
+def incoming_likes_stmt(user_id: int) -> Select:
+    """
+    Входящие лайки пользователя одним запросом: лайкнувший пользователь
+    и ключ лайка (created_at, id). Отклонённые лайки и уже заматченные
+    пары отсекаются в SQL; без сортировки и лимита.
+    """
+    matched_as_user1 = select(MatchModel.id).where(
+        MatchModel.user1_id == user_id,
+        MatchModel.user2_id == LikeModel.liker_id,
+    ).exists()
+    matched_as_user2 = select(MatchModel.id).where(
+        MatchModel.user2_id == user_id,
+        MatchModel.user1_id == LikeModel.liker_id,
+    ).exists()
+    return (
+        select(User, LikeModel.created_at, LikeModel.id)
+        .join(LikeModel, LikeModel.liker_id == User.id)
+        .where(
+            LikeModel.liked_id == user_id,
+            LikeModel.is_ignored.is_(False),
+            LikeModel.liker_id != user_id,
+            User.first_name.is_not(None),
+            ~matched_as_user1,
+            ~matched_as_user2,
+        )
+    )
+
+
+def newest_likes_first(stmt: Select, after: Optional[tuple[datetime, int]] = None) -> Select:
+    """Сортировка по свежести лайка (created_at, id) DESC с keyset-продолжением."""
+    if after is not None:
+        stmt = stmt.where(tuple_(LikeModel.created_at, LikeModel.id) < after)
+    return stmt.order_by(LikeModel.created_at.desc(), LikeModel.id.desc())
@@ -0,0 +1,69 @@
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Select, select, union_all, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models.match import Match as MatchModel
+from models.user import User
+
+
+def _matches_branch(
+    user_id: int,
+    own_column,
+    other_column,
+    limit: int,
+    after: Optional[tuple[datetime, int]],
+) -> Select:
+    """
+    Одна сторона пары: матчи, где user_id стоит в own_column.
+    Читается по индексу (own_column, created_at, id) сразу в нужном порядке.
+    """
+    stmt = (
+        select(
+            User,
+            MatchModel.created_at.label("matched_at"),
+            MatchModel.id.label("match_id"),
+        )
+        .join(MatchModel, other_column == User.id)
+        .where(own_column == user_id, User.first_name.is_not(None))
+    )
+    if after is not None:
+        stmt = stmt.where(tuple_(MatchModel.created_at, MatchModel.id) < after)
+    return stmt.order_by(MatchModel.created_at.desc(), MatchModel.id.desc()).limit(limit)
+
+
+def matches_page_stmt(
+    user_id: int,
+    limit: int,
+    after: Optional[tuple[datetime, int]] = None,
+) -> Select:
+    """
+    Страница собеседников по матчам, от свежих к старым: (user, matched_at, match_id).
+
+    Вместо OR по user1_id/user2_id — UNION ALL двух веток, каждая идёт
+    по своему индексу и отдаёт не больше limit строк; общий порядок
+    и keyset-продолжение по (matched_at, match_id).
+    """
+    both = union_all(
+        _matches_branch(user_id, MatchModel.user1_id, MatchModel.user2_id, limit, after),
+        _matches_branch(user_id, MatchModel.user2_id, MatchModel.user1_id, limit, after),
+    ).subquery("m")
+    matched_user = aliased(User, both)
+    return (
+        select(matched_user, both.c.matched_at, both.c.match_id)
+        .order_by(both.c.matched_at.desc(), both.c.match_id.desc())
+        .limit(limit)
+    )
+
+
+async def fetch_matches(
+    db: AsyncSession,
+    user_id: int,
+    limit: int,
+    after: Optional[tuple[datetime, int]] = None,
+) -> list[tuple[User, datetime, int]]:
+    """Собеседники по матчам: [(user, matched_at, match_id), ...], см. matches_page_stmt."""
+    result = await db.execute(matches_page_stmt(user_id, limit, after))
+    return [tuple(row) for row in result.all()]
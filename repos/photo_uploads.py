@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.photo_upload import PhotoUpload, UPLOAD_FAILED, UPLOAD_PROCESSING
+
+
+def _stale_processing():
+    """Строка застряла в processing: задание потеряно при остановке воркера."""
+    return and_(
+        PhotoUpload.status == UPLOAD_PROCESSING,
+        PhotoUpload.updated_at < func.now() - timedelta(seconds=settings.PHOTO_INGEST_STALE_SECONDS),
+    )
+
+
+async def claim_upload(db: AsyncSession, user_id: int, staging_key: str) -> bool:
+    """
+    Атомарно захватывает staging-ключ под обработку одним INSERT ... ON CONFLICT.
+    True — ключ новый, либо прошлая попытка упала с временной ошибкой или
+    потерялась; False — ключ уже обрабатывается или обработан.
+    Транзакцию фиксирует вызывающий код.
+    """
+    stmt = pg_insert(PhotoUpload).values(
+        staging_key=staging_key,
+        user_id=user_id,
+        status=UPLOAD_PROCESSING,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PhotoUpload.staging_key],
+        set_={"status": UPLOAD_PROCESSING, "error": None, "updated_at": func.now()},
+        where=or_(PhotoUpload.status == UPLOAD_FAILED, _stale_processing()),
+    ).returning(PhotoUpload.staging_key)
+    return (await db.execute(stmt)).scalar_one_or_none() is not None
+
+
+async def count_pending_uploads(db: AsyncSession, user_id: int) -> int:
+    """Подтверждённые, но ещё не обработанные загрузки пользователя."""
+    return (await db.execute(
+        select(func.count()).select_from(PhotoUpload).where(
+            PhotoUpload.user_id == user_id,
+            PhotoUpload.status == UPLOAD_PROCESSING,
+            ~_stale_processing(),
+        )
+    )).scalar_one()
+
+
+async def set_upload_status(
+    db: AsyncSession,
+    staging_key: str,
+    status: str,
+    photo_id: Optional[int] = None,
+    error: Optional[str] = None,
+) -> None:
+    await db.execute(
+        update(PhotoUpload)
+        .where(PhotoUpload.staging_key == staging_key)
+        .values(status=status, photo_id=photo_id, error=error and error[:255], updated_at=func.now())
+    )
+
+
+async def delete_old_uploads(db: AsyncSession, older_than: datetime) -> int:
+    """Удаляет статусы загрузок, не менявшиеся с older_than."""
+    result = await db.execute(delete(PhotoUpload).where(PhotoUpload.updated_at < older_than))
+    return result.rowcount
@@ -3,6 +3,8 @@ import logging
 from fastapi import APIRouter, HTTPException
 
 from core.config import settings
+from core.database import AsyncSessionLocal
+from services.invalidation_bus import invalidation_bus
 from utils.seed_users import seed_users
 from schemas.import_job import (
     ImportFromS3Request,
@@ -63,4 +65,10 @@ async def reset_db(payload: ResetDbRequest) -> ResetDbResponse:
         logger.exception("Очистка БД завершилась ошибкой: %s", exc)
         raise HTTPException(status_code=500, detail="Не удалось очистить базу") from exc
 
+    # Кэши всех воркеров держат данные удалённой базы
+    async with AsyncSessionLocal() as db:
+        await invalidation_bus.publish_flush_all(db)
+        await db.commit()
+    invalidation_bus.flush_local()
+
     return ResetDbResponse(status="ok")
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.database import get_db
 from core.security import get_current_user
 from models.user import User
-from schemas.battle import BattlePair
+from models.battle_rating import BattleRating, DEFAULT_RATING
+from schemas.battle import BattlePair, LeaderboardEntry
 from schemas.user import UserRead
-from utils.s3 import build_photo_urls
+from utils.s3 import build_photo_variants_bulk, full_urls
+from utils.locations import validate_location
+from services.battle_recorder import battle_recorder
+from services.battle_pool import battle_pool, location_key
+from services.battle_leaderboard import battle_leaderboard
+from services.battle_tokens import issue_pair_token, redeem_pair_token
 
 router = APIRouter(prefix="/battle", tags=["battle"])
 
@@ -20,69 +26,138 @@ def _ensure_location(user: User) -> None:
         )
 
 
+def _wanted_genders(user: User) -> list[str | None] | None:
+    if user.gender == "male":
+        return ["female"]
+    if user.gender == "female":
+        return ["male"]
+    return None
+
+
 @router.get("/pair", response_model=BattlePair, summary="Получить пару профилей для баттла")
 async def get_battle_pair(
     winner_id: int | None = None,
+    loser_id: int | None = Query(None, description="Проигравший в предыдущей паре; вместе с winner_id записывает исход"),
+    pair_token: str | None = Query(None, description="pair_token предыдущей пары; обязателен вместе с loser_id"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> BattlePair:
     _ensure_location(current_user)
+    key = location_key(current_user)
+    genders = _wanted_genders(current_user)
+
     if winner_id is not None:
-        winner = await db.get(User, winner_id)
+        if loser_id is not None and loser_id == winner_id:
+            raise HTTPException(status_code=400, detail="Победитель и проигравший совпадают")
+
+        opponent_id = await battle_pool.sample(
+            key,
+            genders,
+            exclude=(winner_id, current_user.id),
+            near_rating=battle_pool.rating(winner_id),
+        )
+
+        # Победитель, соперник и проигравший — одним запросом
+        ids = [i for i in (winner_id, opponent_id, loser_id) if i is not None]
+        result = await db.execute(select(User).where(User.id.in_(ids)))
+        users_by_id = {u.id: u for u in result.scalars().all()}
+
+        winner = users_by_id.get(winner_id)
         if winner is None:
             raise HTTPException(status_code=404, detail="Победитель не найден")
-        if (winner.country, winner.city, winner.district) != (
-            current_user.country,
-            current_user.city,
-            current_user.district,
-        ):
+        if location_key(winner) != key:
             raise HTTPException(status_code=400, detail="Победитель из другой локации")
+        if loser_id is not None:
+            if loser_id not in users_by_id:
+                raise HTTPException(status_code=404, detail="Проигравший не найден")
+            # Записываем только пару, которую сервер сам показал этому пользователю
+            if pair_token is None:
+                raise HTTPException(status_code=400, detail="Для записи исхода нужен pair_token")
+            redeem_pair_token(pair_token, current_user.id, key, winner_id, loser_id)
+            battle_recorder.record(winner_id, loser_id, key)
 
-        stmt = select(User).where(
-            User.id != winner_id,
-            User.id != current_user.id,
-            User.country == current_user.country,
-            User.city == current_user.city,
-            User.district == current_user.district,
-        )
-        if current_user.gender == "male":
-            stmt = stmt.where(User.gender == "female")
-        elif current_user.gender == "female":
-            stmt = stmt.where(User.gender == "male")
-        stmt = stmt.order_by(func.random()).limit(1)
-
-        result = await db.execute(stmt)
-        opponent = result.scalar_one_or_none()
-        if opponent is None:
+        opponent = users_by_id.get(opponent_id) if opponent_id is not None else None
+        if opponent is None or location_key(opponent) != key:
             raise HTTPException(status_code=404, detail="Нет доступных соперников")
 
-        user_read = await _to_user_read(winner, db)
-        opponent_read = await _to_user_read(opponent, db)
-        return BattlePair(user=user_read, opponent=opponent_read)
+        user_read, opponent_read = await _to_user_reads([winner, opponent], db)
+        return BattlePair(
+            user=user_read,
+            opponent=opponent_read,
+            pair_token=issue_pair_token(current_user.id, key, winner.id, opponent.id),
+        )
 
-    stmt = select(User).where(
-        User.id != current_user.id,
-        User.country == current_user.country,
-        User.city == current_user.city,
-        User.district == current_user.district,
-    )
-    if current_user.gender == "male":
-        stmt = stmt.where(User.gender == "female")
-    elif current_user.gender == "female":
-        stmt = stmt.where(User.gender == "male")
-    stmt = stmt.order_by(func.random()).limit(2)
-
-    result = await db.execute(stmt)
-    users = result.scalars().all()
-    if len(users) < 2:
+    first_id = await battle_pool.sample(key, genders, exclude=(current_user.id,))
+    second_id = None
+    if first_id is not None:
+        second_id = await battle_pool.sample(
+            key,
+            genders,
+            exclude=(current_user.id, first_id),
+            near_rating=battle_pool.rating(first_id),
+        )
+    if first_id is None or second_id is None:
+        raise HTTPException(status_code=404, detail="Недостаточно пользователей")
+
+    result = await db.execute(select(User).where(User.id.in_([first_id, second_id])))
+    users_by_id = {u.id: u for u in result.scalars().all()}
+    if len(users_by_id) < 2:
         raise HTTPException(status_code=404, detail="Недостаточно пользователей")
 
-    user_read = await _to_user_read(users[0], db)
-    opponent_read = await _to_user_read(users[1], db)
-    return BattlePair(user=user_read, opponent=opponent_read)
+    user_read, opponent_read = await _to_user_reads(
+        [users_by_id[first_id], users_by_id[second_id]], db
+    )
+    return BattlePair(
+        user=user_read,
+        opponent=opponent_read,
+        pair_token=issue_pair_token(current_user.id, key, first_id, second_id),
+    )
+
+@router.get(
+    "/leaderboard",
+    response_model=list[LeaderboardEntry],
+    summary="Лидеры баттлов района",
+)
+async def get_leaderboard(
+    country: str = Query(..., description="Страна"),
+    city: str = Query(..., description="Город"),
+    district: str = Query(..., description="Район"),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> list[LeaderboardEntry]:
+    if not validate_location(country, city, district):
+        raise HTTPException(status_code=400, detail="Некорректная локация")
+
+    top = await battle_leaderboard.top((country, city, district), limit)
+    if not top:
+        return []
+
+    # Рейтинги — из БД: пул этого воркера мог ещё не загрузить район
+    result = await db.execute(
+        select(User, func.coalesce(BattleRating.rating, DEFAULT_RATING))
+        .outerjoin(BattleRating, BattleRating.user_id == User.id)
+        .where(User.id.in_([uid for uid, _ in top]))
+    )
+    rows = result.all()
+    users_by_id = {u.id: u for u, _ in rows}
+    ratings = {u.id: rating for u, rating in rows}
+    users = [users_by_id[uid] for uid, _ in top if uid in users_by_id]
+    reads = {read.user_id: read for read in await _to_user_reads(users, db)}
+
+    return [
+        LeaderboardEntry(user=reads[uid], wins=wins, rating=round(ratings[uid], 1))
+        for uid, wins in top
+        if uid in reads
+    ]
+
+
+async def _to_user_reads(users: list[User], db: AsyncSession) -> list[UserRead]:
+    photos_by_user = await build_photo_variants_bulk([u.id for u in users], db)
+    return [_to_user_read(user, photos_by_user[user.id]) for user in users]
+
 
-async def _to_user_read(user: User, db: AsyncSession) -> UserRead:
-    photos = await build_photo_urls(user.id, db)
+def _to_user_read(user: User, photos: list[dict[str, str]]) -> UserRead:
     return UserRead(
         user_id=user.id,
         telegram_user_id=user.telegram_user_id,
@@ -90,7 +165,8 @@ async def _to_user_read(user: User, db: AsyncSession) -> UserRead:
         birthdate=user.birthdate,
         gender=user.gender,
         about=user.about,
-        photos=photos,
+        photos=full_urls(photos),
+        photo_variants=photos,
         latitude=user.latitude,
         longitude=user.longitude,
         country=user.country,
@@ -1,19 +1,28 @@
-from typing import List
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, not_
+from typing import List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
 from core.database import get_db
 from core.security import get_current_user
 from models.user import User
-from models.like import Like as LikeModel
-from models.match import Match as MatchModel
-from models.feed_view import FeedView
+from repos.feed import feed_candidates_stmt, newest_first, load_candidates, fetch_nearby_candidates
 from schemas.user import UserRead
-from utils.s3 import build_photo_urls
+from services.feed_queue import feed_engine
+from utils.s3 import build_photo_variants_bulk, full_urls
+from utils.pagination import (
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    decode_distance_cursor,
+    encode_cursor,
+    encode_distance_cursor,
+)
 
 router = APIRouter(prefix="/feed", tags=["feed"])
 
+# Курсор ранжированной ленты: очередь сама помнит позицию пользователя
+RANKED_CURSOR = "ranked"
+
 
 @router.get(
     "/",
@@ -21,34 +30,68 @@ router = APIRouter(prefix="/feed", tags=["feed"])
     summary="Получить ленту кандидатов"
 )
 async def get_feed(
+    response: Response,
     limit: int = Query(20, ge=1, le=50),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Устаревший способ пагинации, используйте cursor"),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    sort: Literal["created", "distance"] = Query("created", description="created — новые анкеты, distance — ближайшие"),
+    radius_km: Optional[float] = Query(None, gt=0, le=500, description="Радиус поиска для sort=distance"),
+    ranked: bool = Query(False, description="Ранжированная лента из предрасчитанной очереди"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> List[UserRead]:
-    # Формируем подзапросы для исключения: лайкнутых, заматченных
-    sub_liked = select(LikeModel.liked_id).where(LikeModel.liker_id == current_user.id)
-    sub_matched1 = select(MatchModel.user1_id).where(MatchModel.user2_id == current_user.id)
-    sub_matched2 = select(MatchModel.user2_id).where(MatchModel.user1_id == current_user.id)
-    stmt = select(User).where(
-        User.id != current_user.id,
-        not_(User.id.in_(sub_liked)),
-        not_(User.id.in_(sub_matched1)),
-        not_(User.id.in_(sub_matched2)),
-    )
+    distances: dict[int, float] = {}
+    if sort == "distance" or radius_km is not None:
+        if current_user.latitude is None or current_user.longitude is None:
+            raise HTTPException(status_code=400, detail="Для ленты по расстоянию нужна геопозиция")
+        # Keyset по (расстояние, id); offset поддерживается, но дороже — он перечитывается
+        nearby = await fetch_nearby_candidates(
+            db,
+            current_user.id,
+            current_user.gender,
+            current_user.latitude,
+            current_user.longitude,
+            radius_km or settings.FEED_DEFAULT_RADIUS_KM,
+            limit if cursor is not None else offset + limit,
+            after=decode_distance_cursor(cursor) if cursor is not None else None,
+        )
+        page = nearby if cursor is not None else nearby[offset:]
+        users = [user for user, _ in page]
+        distances = {user.id: round(distance, 1) for user, distance in page}
+        if len(page) == limit:
+            last_user, last_distance = page[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_distance_cursor(last_distance, last_user.id)
+    elif settings.FEED_QUEUE_ENABLED and not offset and (
+        cursor == RANKED_CURSOR or (ranked and cursor is None)
+    ):
+        # Быстрый путь: id уже лежат в предрасчитанной очереди пользователя.
+        # Порядок не совпадает с created_at, поэтому продолжение — только через очередь
+        ids = await feed_engine.next_ids(current_user.id, current_user.gender, limit)
+        users = await load_candidates(db, current_user.id, current_user.gender, ids)
+        if len(ids) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = RANKED_CURSOR
+    else:
+        if cursor == RANKED_CURSOR:
+            # Очередь выключена — продолжаем обычную ленту с начала
+            cursor = None
+        stmt = feed_candidates_stmt(current_user.id, current_user.gender)
+        if cursor is not None:
+            # Keyset-пагинация: продолжаем строго после последней строки прошлой страницы
+            stmt = newest_first(stmt, after=decode_cursor(cursor))
+        else:
+            stmt = newest_first(stmt).offset(offset)
+        result = await db.execute(stmt.limit(limit))
+        users = result.scalars().all()
 
-    if current_user.gender == "male":
-        stmt = stmt.where(User.gender == "female")
-    elif current_user.gender == "female":
-        stmt = stmt.where(User.gender == "male")
+        if len(users) == limit:
+            last = users[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
 
-    stmt = stmt.order_by(User.created_at.desc()).offset(offset).limit(limit)
-    result = await db.execute(stmt)
-    users = result.scalars().all()
+    photos_by_user = await build_photo_variants_bulk([u.id for u in users], db)
 
     feed: List[UserRead] = []
     for user in users:
-        photos = await build_photo_urls(user.id, db)
+        photos = photos_by_user[user.id]
         feed.append(UserRead(
             user_id=user.id,
             telegram_user_id=user.telegram_user_id,
@@ -63,7 +106,9 @@ async def get_feed(
             is_premium=user.is_premium,
             premium_expires_at=user.premium_expires_at,
             created_at=user.created_at,
-            photos=photos,
+            photos=full_urls(photos),
+            photo_variants=photos,
+            distance_km=distances.get(user.id),
         ))
     return feed
 
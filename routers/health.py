@@ -1,9 +1,30 @@
 # routers/health.py
 from fastapi import APIRouter
 
+from core.security import user_cache
+from services.view_buffer import view_buffer
+from services.top_cache import top_liked_cache
+from services.telegram_bot import notifications
+from services.invalidation_bus import invalidation_bus
+from services.image_pool import image_processor
+from services.photo_ingest import photo_ingest
+
 router = APIRouter()
 
 
 @router.get("/health", summary="Health check")
 async def healthcheck():
     return {"status": "ok"}
+
+
+@router.get("/health/metrics", summary="Внутренние метрики буферов и кэшей")
+async def internal_metrics():
+    return {
+        "view_buffer": view_buffer.metrics(),
+        "top_liked_cache": top_liked_cache.metrics(),
+        "notifications": notifications.metrics(),
+        "user_cache": user_cache.stats(),
+        "invalidation_bus": invalidation_bus.metrics(),
+        "image_pool": image_processor.metrics(),
+        "photo_ingest": photo_ingest.metrics(),
+    }
@@ -1,20 +1,24 @@
-from typing import List
-import asyncio
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, func, or_
+from sqlalchemy import select, func
 
-from core.database import get_db
+from core.database import get_db, is_foreign_key_violation
 from core.security import get_current_user
-from models.feed_view import FeedView
 from models.user import User
 from models.like import Like as LikeModel
-from models.match import Match as MatchModel
-from schemas.like import LikeResponse
+from schemas.like import LikeResponse, IncomingLikesCount
 from schemas.user import UserRead, TopUserRead
-from utils.s3 import build_photo_urls
-from services.telegram_bot import send_like_notification, send_match_notification
+from utils.s3 import build_photo_variants, build_photo_variants_bulk, full_urls
+from utils.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from services.telegram_bot import notifications
+from services.feed_queue import feed_engine
+from services.view_buffer import view_buffer
+from services.top_cache import top_liked_cache
+from repos.likes import toggle_like, incoming_likes_stmt, newest_likes_first
+from repos.matches import fetch_matches
 
 
 router = APIRouter(prefix="/interactions", tags=["interactions"])
@@ -32,10 +36,8 @@ async def view_profile(
 ):
     if user_id == current_user.id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Нельзя просматривать свой профиль")
-    # Записываем просмотр
-    view = FeedView(viewer_id=current_user.id, viewed_id=user_id)
-    db.add(view)
-    await db.commit()
+    # Просмотр пишется в базу пачкой фоновой задачей
+    await view_buffer.enqueue(current_user.id, user_id)
 
     return
 
@@ -54,69 +56,29 @@ async def like_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Нельзя лайкать себя")
 
 
-    print(f' кто:  {current_user.id} \n кому: {user_id}')
-    res = await db.execute(
-        select(LikeModel)
-        .where(
-            LikeModel.liker_id == current_user.id,
-            LikeModel.liked_id == user_id,
-        )
-    )
-
-
-    like_obj = res.scalar_one_or_none()
-    print(like_obj)
-
-    if like_obj:
-        await db.delete(like_obj)
+    try:
+        toggle = await toggle_like(db, current_user.id, user_id)
         await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        # Несуществующий получатель — 404; прочие нарушения — ошибка сервера
+        if is_foreign_key_violation(exc):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        raise
 
-        u1, u2 = sorted([current_user.id, user_id])
-        match_res = await db.execute(
-            select(MatchModel)
-            .where(
-                MatchModel.user1_id == u1,
-                MatchModel.user2_id == u2,
-            )
-        )
-        match_obj = match_res.scalar_one_or_none()
-        if match_obj:
-            await db.delete(match_obj)
-            await db.commit()
-
+    if not toggle.liked:
         return LikeResponse(liked=False, matched=False, match_user=None)
 
-    new_like = LikeModel(liker_id=current_user.id, liked_id=user_id)
-    db.add(new_like)
-    await db.commit()
-    await db.refresh(new_like)
+    await feed_engine.on_like(current_user.id, user_id)
 
-    mutual = await db.execute(
-        select(func.count(LikeModel.id))
-        .where(
-            LikeModel.liker_id == user_id,
-            LikeModel.liked_id == current_user.id,
-        )
-    )
-    if mutual.scalar_one() > 0:
-        u1, u2 = sorted([current_user.id, user_id])
-        match_check = await db.execute(
-            select(func.count(MatchModel.id))
-            .where(
-                MatchModel.user1_id == u1,
-                MatchModel.user2_id == u2,
-            )
-        )
-        if match_check.scalar_one() == 0:
-            new_match = MatchModel(user1_id=u1, user2_id=u2)
-            db.add(new_match)
-            await db.commit()
-            await db.refresh(new_match)
+    if toggle.mutual:
+        if toggle.match_created:
+            await feed_engine.on_match(current_user.id, user_id)
 
         matched = await db.get(User, user_id)
         if not matched:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-        urls = await build_photo_urls(matched.id, db)
+        photos = await build_photo_variants(matched.id, db)
         user_read = UserRead(
             user_id=matched.id,
             telegram_user_id=matched.telegram_user_id,
@@ -131,18 +93,19 @@ async def like_user(
             is_premium=matched.is_premium,
             premium_expires_at=matched.premium_expires_at,
             created_at=matched.created_at,
-            photos=urls,
+            photos=full_urls(photos),
+            photo_variants=photos,
         )
-        if matched.telegram_user_id:
-            asyncio.create_task(send_match_notification(matched.telegram_user_id))
-        if current_user.telegram_user_id:
-            asyncio.create_task(send_match_notification(current_user.telegram_user_id))
+        if toggle.match_created:
+            if matched.telegram_user_id:
+                notifications.notify_match(matched.telegram_user_id)
+            if current_user.telegram_user_id:
+                notifications.notify_match(current_user.telegram_user_id)
 
         return LikeResponse(liked=True, matched=True, match_user=user_read)
 
-    liked_user = await db.get(User, user_id)
-    if liked_user and liked_user.telegram_user_id:
-        asyncio.create_task(send_like_notification(liked_user.telegram_user_id))
+    if toggle.liked_telegram_id:
+        notifications.notify_like(toggle.liked_telegram_id)
 
     return LikeResponse(liked=True, matched=False, match_user=None)
 
@@ -179,42 +142,33 @@ async def ignore_user(
 
 @router.get(
     "/likes",
-    response_model=List[UserRead],
+    response_model=Union[List[UserRead], IncomingLikesCount],
     summary="Список пользователей, которые поставили вам лайк, без отклонённых и без матчей"
 )
 async def incoming_likes(
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
+    count_only: bool = Query(False, description="Вернуть только количество (для бейджа)"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
-) -> List[UserRead]:
-    res = await db.execute(
-        select(LikeModel.liker_id)
-        .where(
-            LikeModel.liked_id == current_user.id,
-            LikeModel.is_ignored.is_(False),
-            LikeModel.liker_id != current_user.id,
-        )
-    )
-    liker_ids = [row[0] for row in res.all()]
-    if not liker_ids:
-        return []
+) -> Union[List[UserRead], IncomingLikesCount]:
+    stmt = incoming_likes_stmt(current_user.id)
+    if count_only:
+        total = await db.scalar(select(func.count()).select_from(stmt.with_only_columns(LikeModel.id).subquery()))
+        return IncomingLikesCount(count=total)
+
+    after = decode_cursor(cursor) if cursor is not None else None
+    res = await db.execute(newest_likes_first(stmt, after).limit(limit))
+    rows = res.all()
+    if len(rows) == limit:
+        _, liked_at, like_id = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(liked_at, like_id)
 
-    # исключаем уже заматченных
-    r1 = await db.execute(
-        select(MatchModel.user1_id).where(MatchModel.user2_id == current_user.id)
-    )
-    r2 = await db.execute(
-        select(MatchModel.user2_id).where(MatchModel.user1_id == current_user.id)
-    )
-    matched = set([r[0] for r in r1.all()] + [r[0] for r in r2.all()])
+    photos_by_user = await build_photo_variants_bulk([user.id for user, _, _ in rows], db)
 
     output: List[UserRead] = []
-    for uid in liker_ids:
-        if uid in matched:
-            continue
-        user = await db.get(User, uid)
-        if not user or not user.first_name:
-            continue
-        urls = await build_photo_urls(uid, db)
+    for user, _, _ in rows:
         output.append(UserRead(
             user_id=user.id,
             telegram_user_id=user.telegram_user_id,
@@ -229,7 +183,8 @@ async def incoming_likes(
             is_premium=user.is_premium,
             premium_expires_at=user.premium_expires_at,
             created_at=user.created_at,
-            photos=urls,
+            photos=full_urls(photos_by_user[user.id]),
+            photo_variants=photos_by_user[user.id],
         ))
     return output
 
@@ -239,33 +194,8 @@ async def incoming_likes(
     response_model=List[TopUserRead],
     summary="Топ пользователей по количеству лайков"
 )
-async def top_liked_users(
-    db: AsyncSession = Depends(get_db),
-) -> List[TopUserRead]:
-    res = await db.execute(
-        select(User, func.count(LikeModel.id).label("likes_count"))
-        .join(LikeModel, LikeModel.liked_id == User.id)
-        .group_by(User.id)
-        .order_by(desc("likes_count"))
-        .limit(20)
-    )
-    rows = res.all()
-    output: List[TopUserRead] = []
-    for user, likes_count in rows:
-        urls = await build_photo_urls(user.id, db)
-        output.append(TopUserRead(
-            user_id=user.id,
-            first_name=user.first_name,
-            birthdate=user.birthdate,
-            gender=user.gender,
-            about=user.about,
-            telegram_username=user.telegram_username,
-            instagram_username=user.instagram_username,
-            photos=urls,
-            created_at=user.created_at,
-            likes_count=likes_count,
-        ))
-    return output
+async def top_liked_users() -> List[TopUserRead]:
+    return await top_liked_cache.top()
 
 
 @router.get(
@@ -274,28 +204,22 @@ async def top_liked_users(
     summary="Список пользователей, с которыми у вас совпадения"
 )
 async def get_my_matches(
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Курсор из заголовка X-Next-Cursor предыдущей страницы"),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ) -> List[UserRead]:
-    # Ищем все матчи, где текущий пользователь — участник
-    stmt = select(MatchModel).where(
-        or_(
-            MatchModel.user1_id == current_user.id,
-            MatchModel.user2_id == current_user.id,
-        )
-    )
-    result = await db.execute(stmt)
-    matches = result.scalars().all()
+    after = decode_cursor(cursor) if cursor is not None else None
+    rows = await fetch_matches(db, current_user.id, limit, after)
+    if len(rows) == limit:
+        _, matched_at, match_id = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(matched_at, match_id)
+
+    photos_by_user = await build_photo_variants_bulk([user.id for user, _, _ in rows], db)
 
     out: List[UserRead] = []
-    for match in matches:
-        # Определяем ID другого пользователя в матче
-        other_id = match.user2_id if match.user1_id == current_user.id else match.user1_id
-        user = await db.get(User, other_id)
-        if not user or not user.first_name:
-            continue
-
-        photos = await build_photo_urls(other_id, db)
+    for user, _, _ in rows:
         out.append(UserRead(
             user_id=user.id,
             telegram_user_id=user.telegram_user_id,
@@ -310,6 +234,7 @@ async def get_my_matches(
             is_premium=user.is_premium,
             premium_expires_at=user.premium_expires_at,
             created_at=user.created_at,
-            photos=photos,
+            photos=full_urls(photos_by_user[user.id]),
+            photo_variants=photos_by_user[user.id],
         ))
-    return out
\ No newline at end of file
+    return out
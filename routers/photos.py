@@ -8,13 +8,32 @@ from core.database import get_db
 from core.config import settings
 from core.security import get_current_user
 from models.photo import Photo
-from schemas.photo import PhotoRead
-from utils.s3 import upload_file_to_s3, delete_file_from_s3
+from models.photo_upload import PhotoUpload, UPLOAD_FAILED, UPLOAD_PROCESSING
+from schemas.photo import PhotoRead, PhotoUploadConfirm, PhotoUploadStatus, PhotoUploadTicket
+from repos.photo_uploads import claim_upload, count_pending_uploads, set_upload_status
+from utils.s3 import (
+    STAGING_BUCKET,
+    STAGING_PREFIX,
+    delete_file_from_s3,
+    photo_variant_urls,
+    presigned_post_form,
+    staging_key,
+    stat_object_size,
+    variant_key,
+)
+from utils.image_tools import PHOTO_VARIANTS
+from services.image_pool import image_processor
+from services.photo_ingest import IngestJob, photo_ingest
+from utils.upload_limits import check_upload_size
 
 router = APIRouter(prefix="/photos", tags=["photos  "])
 
 # Максимальное число фото на пользователя
-MAX_PHOTOS = getattr(settings, "MAX_PHOTOS", 6)
+MAX_PHOTOS = settings.MAX_PHOTOS
+
+
+def _own_staging_key(key: str, user_id: int) -> bool:
+    return key.startswith(f"{STAGING_PREFIX}/{user_id}/") and ".." not in key
 
 @router.post(
     "/",
@@ -37,34 +56,138 @@ async def upload_photo(
     if total >= MAX_PHOTOS:
         raise HTTPException(status_code=400, detail=f"Нельзя иметь более {MAX_PHOTOS} фото")
 
+    check_upload_size(photo)
+
     # Загружаем файл в S3
     try:
-        s3_key = await run_in_threadpool(
-            upload_file_to_s3,
+        s3_key = await image_processor.upload_image(
             photo.file,
             photo.filename,
             settings.AWS_S3_BUCKET_NAME,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     # Сохраняем запись в БД
-    new_photo = Photo(user_id=user_id, s3_key=s3_key, is_general=False)
+    new_photo = Photo(user_id=user_id, s3_key=s3_key, is_general=False, has_variants=True)
     db.add(new_photo)
     await db.commit()
     await db.refresh(new_photo)
 
-    # Формируем публичный URL
-    url = f"{settings.AWS_S3_ENDPOINT_URL.rstrip('/')}/{settings.AWS_S3_BUCKET_NAME}/{s3_key}"
+    # Формируем публичные URL
+    variants = photo_variant_urls(s3_key, new_photo.has_variants)
 
     return PhotoRead(
         photo_id=new_photo.id,
         user_id=new_photo.user_id,
-        url=url,
+        url=variants["full"],
+        variants=variants,
         is_general=new_photo.is_general,
         created_at=new_photo.created_at,
     )
 
+@router.post(
+    "/upload-url",
+    response_model=PhotoUploadTicket,
+    summary="Получить форму для загрузки фото напрямую в S3",
+)
+async def create_upload_url(
+    current_user=Depends(get_current_user),
+) -> PhotoUploadTicket:
+    key = staging_key(current_user.id)
+    try:
+        url, fields = await run_in_threadpool(
+            presigned_post_form,
+            key,
+            STAGING_BUCKET,
+            settings.PRESIGNED_UPLOAD_EXPIRE_SECONDS,
+            settings.UPLOAD_MAX_FILE_BYTES,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return PhotoUploadTicket(
+        upload_url=url,
+        fields=fields,
+        staging_key=key,
+        expires_in=settings.PRESIGNED_UPLOAD_EXPIRE_SECONDS,
+        max_bytes=settings.UPLOAD_MAX_FILE_BYTES,
+    )
+
+
+@router.post(
+    "/confirm",
+    response_model=PhotoUploadStatus,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Подтвердить загрузку по форме и поставить фото в обработку",
+)
+async def confirm_upload(
+    payload: PhotoUploadConfirm,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> PhotoUploadStatus:
+    user_id = current_user.id
+    key = payload.staging_key
+    # Подтвердить можно только свой staging-объект
+    if not _own_staging_key(key, user_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    # Ключ захватывается до проверок: повторное или параллельное подтверждение
+    # не ставит фото в обработку второй раз, а только возвращает статус
+    if not await claim_upload(db, user_id, key):
+        await db.rollback()
+        return await get_upload_status(key, db, current_user)
+
+    # Захваченная загрузка сама входит в pending, отсюда «>»
+    total = (await db.execute(
+        select(func.count(Photo.id)).where(Photo.user_id == user_id)
+    )).scalar_one() + await count_pending_uploads(db, user_id)
+    if total > MAX_PHOTOS:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Нельзя иметь более {MAX_PHOTOS} фото")
+
+    # Размер и тип ограничены политикой формы — здесь только наличие объекта
+    try:
+        size = await run_in_threadpool(stat_object_size, key, STAGING_BUCKET)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    if size is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Upload not found")
+    await db.commit()
+
+    try:
+        photo_ingest.enqueue(IngestJob(user_id=user_id, staging_key=key))
+    except HTTPException:
+        await set_upload_status(db, key, UPLOAD_FAILED, error="Очередь обработки переполнена")
+        await db.commit()
+        raise
+    return PhotoUploadStatus(staging_key=key, status=UPLOAD_PROCESSING)
+
+
+@router.get(
+    "/uploads/{staging_key:path}",
+    response_model=PhotoUploadStatus,
+    summary="Статус обработки загруженного фото",
+)
+async def get_upload_status(
+    staging_key: str,
+    db: AsyncSession = Depends(get_db),
+    current_user=Depends(get_current_user),
+) -> PhotoUploadStatus:
+    upload = (await db.execute(
+        select(PhotoUpload).where(
+            PhotoUpload.staging_key == staging_key,
+            PhotoUpload.user_id == current_user.id,
+        )
+    )).scalar_one_or_none()
+    if upload is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return PhotoUploadStatus.model_validate(upload)
+
+
 @router.get(
     "/",
     response_model=List[PhotoRead],
@@ -88,6 +211,7 @@ async def list_photos(
             photo_id=p.id,
             user_id=p.user_id,
             url=f"{base}/{p.s3_key}",
+            variants=photo_variant_urls(p.s3_key, p.has_variants, base),
             is_general=p.is_general,
             created_at=p.created_at,
         )
@@ -118,13 +242,15 @@ async def delete_photo(
     if count <= 1:
         raise HTTPException(status_code=400, detail="Нельзя удалить последнее фото")
 
-    # Удаляем файл из S3
+    # Удаляем файл (и размерные варианты) из S3
+    keys = [variant_key(photo.s3_key, v) for v in PHOTO_VARIANTS] if photo.has_variants else [photo.s3_key]
     try:
-        await run_in_threadpool(
-            delete_file_from_s3,
-            photo.s3_key,
-            settings.AWS_S3_BUCKET_NAME,
-        )
+        for key in keys:
+            await run_in_threadpool(
+                delete_file_from_s3,
+                key,
+                settings.AWS_S3_BUCKET_NAME,
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
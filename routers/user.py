@@ -4,26 +4,55 @@ from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File,
 from fastapi.params import Path
 from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import insert, select, update, func
 from datetime import date, timedelta, datetime
 from typing import List, Optional
 
-from starlette.concurrency import run_in_threadpool
 
 from core.database import get_db
 from core.config import settings
-from core.security import get_current_user, verify_init_data
+from core.security import get_current_user, invalidate_user, verify_init_data
+from core.id_generator import generate_random_id
 from models.user import User
 from models.photo import Photo
 from schemas.auth import InitDataSchema, TokenResponse
 from schemas.user import UserRead, UserCreate, UserUpdate
 from schemas.location import LocationUpdate
-from utils.s3 import upload_file_to_s3, build_photo_urls
+from utils.s3 import build_photo_variants, full_urls
 from utils.locations import validate_location
+from utils.geo import encode_geohash
+from services.feed_queue import feed_engine
+from services.battle_pool import LocationKey, battle_pool, encode_location_key, location_key
+from services.invalidation_bus import invalidation_bus
+from services.image_pool import image_processor
+from utils.upload_limits import check_upload_size
 
 router = APIRouter(prefix="/users", tags=["users"])  #(prefix="/users", tags=["users"])
 
 
+def _update_geohash(user: User) -> None:
+    if user.latitude is not None and user.longitude is not None:
+        user.geohash = encode_geohash(user.latitude, user.longitude)
+    else:
+        user.geohash = None
+
+
+async def _publish_battle_changes(
+    db: AsyncSession,
+    old_key: Optional[LocationKey],
+    new_key: Optional[LocationKey],
+    gender_changed: bool,
+) -> None:
+    """Районы баттлов, которых касается смена локации или пола, перечитаются во всех воркерах."""
+    location_changed = old_key != new_key
+    for key in {old_key, new_key} - {None}:
+        if location_changed or gender_changed:
+            await invalidation_bus.publish(db, "battle_pool", encode_location_key(key))
+        if location_changed:
+            # Старые баттлы без района считаются по текущему району победителя
+            await invalidation_bus.publish(db, "battle_leaderboard", encode_location_key(key))
+
+
 @router.post(
     "/",
     response_model=TokenResponse,
@@ -40,6 +69,8 @@ async def create_or_login_user(
     file: UploadFile = File(..., description="Главная фотография профиля"),
     db: AsyncSession = Depends(get_db),
 ):
+    check_upload_size(file)
+
     # 1. Верифицируем init_data и получаем telegram_user_id, username
     data = verify_init_data(init_data)
     user_obj = data.get("user")
@@ -73,11 +104,13 @@ async def create_or_login_user(
 
         # Загружаем главное фото
         try:
-            s3_key = upload_file_to_s3(
+            s3_key = await image_processor.upload_image(
                 file.file,
                 file.filename,
                 settings.AWS_S3_BUCKET_NAME
             )
+        except HTTPException:
+            raise
         except ValueError as ve:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -89,9 +122,10 @@ async def create_or_login_user(
                 detail=str(e)
             )
 
-        photo = Photo(user_id=user.id, s3_key=s3_key, is_general=True)
+        photo = Photo(user_id=user.id, s3_key=s3_key, is_general=True, has_variants=True)
         db.add(photo)
         await db.commit()
+        await feed_engine.on_new_user(user.id, user.gender)
     else:
         # 3.2. Если есть — просто логиним, игнорируем form-data
         pass  # никаких дополнительных действий не требуется
@@ -129,7 +163,7 @@ async def read_my_profile(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    photos = await build_photo_urls(current_user.id, db)
+    photos = await build_photo_variants(current_user.id, db)
     return UserRead(
         user_id=current_user.id,
         telegram_user_id=current_user.telegram_user_id,
@@ -142,7 +176,8 @@ async def read_my_profile(
         district=current_user.district,
         telegram_username=current_user.telegram_username,
         instagram_username=current_user.instagram_username,
-        photos=photos,
+        photos=full_urls(photos),
+        photo_variants=photos,
         is_premium=current_user.is_premium,
         created_at=current_user.created_at,
     )
@@ -179,11 +214,13 @@ async def update_my_profile(
     country = _clean_value(country)
     city = _clean_value(city)
     district = _clean_value(district)
+    old_location, old_gender = location_key(current_user), current_user.gender
 
     if first_name is not None:
         current_user.first_name = first_name
     if birthdate is not None:
         current_user.birthdate = birthdate
+    gender_changed = gender is not None and gender != current_user.gender
     if gender is not None:
         current_user.gender = gender
     if about is not None:
@@ -196,6 +233,8 @@ async def update_my_profile(
         current_user.latitude = latitude
     if longitude is not None:
         current_user.longitude = longitude
+    if latitude is not None or longitude is not None:
+        _update_geohash(current_user)
     if any(value is not None for value in (country, city, district)):
         if not all(value is not None for value in (country, city, district)):
             raise HTTPException(
@@ -209,34 +248,67 @@ async def update_my_profile(
         current_user.district = district
 
     db.add(current_user)
+    # Другие воркеры сбросят свои копии после коммита
+    await invalidation_bus.publish(db, "user", current_user.id)
+    await invalidation_bus.publish(db, "top", current_user.id)
+    if gender_changed:
+        await invalidation_bus.publish(db, "feed", current_user.id)
+    await _publish_battle_changes(db, old_location, location_key(current_user), gender_changed)
     await db.commit()
+    invalidate_user(current_user.id)
     await db.refresh(current_user)
+    if gender_changed:
+        # Очередь ленты собрана под прежний пол — пересоберём с нуля
+        await feed_engine.invalidate(current_user.id)
+    battle_pool.move(
+        current_user.id, old_location, old_gender, location_key(current_user), current_user.gender
+    )
 
     if photos is not None:
-        await db.execute(
-            update(Photo)
-            .where(Photo.user_id == current_user.id, Photo.is_general.is_(True))
-            .values(is_general=False)
-        )
-        await db.commit()
         for upload in photos:
-            try:
-                s3_key = await run_in_threadpool(
-                    upload_file_to_s3,
-                    upload.file,
-                    upload.filename,
-                    settings.AWS_S3_BUCKET_NAME
-                )
-            except ValueError as ve:
-                raise HTTPException(status_code=400, detail=str(ve))
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=str(e))
-
-            new_photo = Photo(user_id=current_user.id, s3_key=s3_key, is_general=False)
-            db.add(new_photo)
-        await db.commit()
+            check_upload_size(upload)
+        # Все фото загружаются параллельно; при ошибке загруженные удаляются
+        try:
+            s3_keys = await image_processor.upload_images(
+                [(upload.file, upload.filename) for upload in photos],
+                settings.AWS_S3_BUCKET_NAME
+            )
+        except HTTPException:
+            raise
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
 
-    photos = await build_photo_urls(current_user.id, db)
+        try:
+            await db.execute(
+                update(Photo)
+                .where(Photo.user_id == current_user.id, Photo.is_general.is_(True))
+                .values(is_general=False)
+            )
+            if s3_keys:
+                # Core-insert минует before_insert, поэтому id задаём сами.
+                # Порядок фото в профиле — по created_at: время берём из БД,
+                # а порядок файлов сохраняем сдвигом на микросекунды
+                await db.execute(insert(Photo).values([
+                    {
+                        "id": generate_random_id("photos"),
+                        "user_id": current_user.id,
+                        "s3_key": s3_key,
+                        "is_general": False,
+                        "has_variants": True,
+                        "created_at": func.now() + timedelta(microseconds=index),
+                    }
+                    for index, s3_key in enumerate(s3_keys)
+                ]))
+                await invalidation_bus.publish(db, "top", current_user.id)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            await image_processor.discard(s3_keys, settings.AWS_S3_BUCKET_NAME)
+            raise
+
+    photos = await build_photo_variants(current_user.id, db)
     return UserRead(
         user_id=current_user.id,
         telegram_user_id=current_user.telegram_user_id,
@@ -249,7 +321,8 @@ async def update_my_profile(
         district=current_user.district,
         telegram_username=current_user.telegram_username,
         instagram_username=current_user.instagram_username,
-        photos=photos,
+        photos=full_urls(photos),
+        photo_variants=photos,
         is_premium=current_user.is_premium,
         created_at=current_user.created_at,
     )
@@ -271,7 +344,7 @@ async def read_user_profile(
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(404, "Пользователь не найден")
-    photos = await build_photo_urls(user.id, db)
+    photos = await build_photo_variants(user.id, db)
     return UserRead(
         user_id=user.id,
         telegram_user_id=user.telegram_user_id,
@@ -284,7 +357,8 @@ async def read_user_profile(
         district=user.district,
         telegram_username=user.telegram_username,
         instagram_username=user.instagram_username,
-        photos=photos,
+        photos=full_urls(photos),
+        photo_variants=photos,
         is_premium=user.is_premium,
         created_at=user.created_at,
     )
@@ -302,6 +376,7 @@ async def update_my_location(
 ):
     if not validate_location(payload.country, payload.city, payload.district):
         raise HTTPException(status_code=400, detail="Некорректная локация")
+    old_location = location_key(current_user)
 
     current_user.country = payload.country
     current_user.city = payload.city
@@ -310,12 +385,19 @@ async def update_my_location(
         current_user.latitude = payload.latitude
     if payload.longitude is not None:
         current_user.longitude = payload.longitude
+    _update_geohash(current_user)
 
     db.add(current_user)
+    await invalidation_bus.publish(db, "user", current_user.id)
+    await _publish_battle_changes(db, old_location, location_key(current_user), gender_changed=False)
     await db.commit()
+    invalidate_user(current_user.id)
     await db.refresh(current_user)
+    battle_pool.move(
+        current_user.id, old_location, current_user.gender, location_key(current_user), current_user.gender
+    )
 
-    photos = await build_photo_urls(current_user.id, db)
+    photos = await build_photo_variants(current_user.id, db)
     return UserRead(
         user_id=current_user.id,
         telegram_user_id=current_user.telegram_user_id,
@@ -328,7 +410,8 @@ async def update_my_location(
         district=current_user.district,
         telegram_username=current_user.telegram_username,
         instagram_username=current_user.instagram_username,
-        photos=photos,
+        photos=full_urls(photos),
+        photo_variants=photos,
         is_premium=current_user.is_premium,
         created_at=current_user.created_at,
     )
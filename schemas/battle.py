@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from .user import UserRead
 
@@ -6,6 +6,17 @@ from .user import UserRead
 class BattlePair(BaseModel):
     user: UserRead
     opponent: UserRead
+    pair_token: str = Field(..., description="Передаётся вместе с winner_id/loser_id при голосовании за эту пару")
+
+    class Config:
+        from_attributes = True
+        validate_by_name = True
+
+
+class LeaderboardEntry(BaseModel):
+    user: UserRead
+    wins: int
+    rating: float
 
     class Config:
         from_attributes = True
@@ -11,3 +11,7 @@ class LikeResponse(BaseModel):
     class Config:
         from_attributes = True
         validate_by_name = True
+
+
+class IncomingLikesCount(BaseModel):
+    count: int
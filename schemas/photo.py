@@ -1,14 +1,48 @@
 from pydantic import BaseModel, HttpUrl, Field
 from datetime import datetime
+from typing import Optional
+
+
+class PhotoVariants(BaseModel):
+    thumb: str = Field(..., description="Миниатюра для списков (до 320 px)")
+    card: str = Field(..., description="Карточка ленты (до 960 px)")
+    full: str = Field(..., description="Полноэкранный просмотр (до 2560 px)")
 
 
 class PhotoRead(BaseModel):
     photo_id: int = Field(..., alias="photo_id", description="PK в базе данных")
     user_id: int = Field(..., alias="user_id", description="ID пользователя")
     url: HttpUrl = Field(..., description="URL изображения")
+    variants: Optional[PhotoVariants] = Field(None, description="URL размерных вариантов")
     is_general: bool = Field(..., description="Признак главной фотографии")
     created_at: datetime = Field(..., description="Дата и время добавления фотографии")
 
     class Config:
         from_attributes = True
         validate_by_name = True
+
+
+class PhotoUploadTicket(BaseModel):
+    upload_url: str = Field(..., description="Адрес для POST multipart/form-data напрямую в S3")
+    fields: dict[str, str] = Field(
+        ...,
+        description="Поля формы, отправляемые до файла; плюс Content-Type image/* и сам файл в поле file",
+    )
+    staging_key: str = Field(..., description="Ключ загруженного файла для подтверждения")
+    expires_in: int = Field(..., description="Срок действия формы в секундах")
+    max_bytes: int = Field(..., description="Максимальный размер файла")
+
+
+class PhotoUploadConfirm(BaseModel):
+    staging_key: str = Field(..., description="Ключ из PhotoUploadTicket")
+
+
+class PhotoUploadStatus(BaseModel):
+    staging_key: str = Field(..., description="Ключ загрузки")
+    status: str = Field(..., description="processing, done, rejected или failed (можно подтвердить снова)")
+    photo_id: Optional[int] = Field(None, description="Созданное фото, когда status=done")
+    error: Optional[str] = Field(None, description="Причина для rejected и failed")
+
+    class Config:
+        from_attributes = True
+        validate_by_name = True
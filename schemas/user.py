@@ -3,6 +3,8 @@ from datetime import datetime, date
 
 from pydantic import BaseModel, Field
 
+from schemas.photo import PhotoVariants
+
 
 class UserBase(BaseModel):
     telegram_user_id: Optional[int] = Field(..., description="ID пользователя из Telegram")
@@ -60,12 +62,14 @@ class UserRead(UserBase):
     gender: Optional[str] = Field(None, description="Пол")
     about: Optional[str] = Field(None, description="О себе")
     photos: List[str] = Field([], description="Список URL фотографий профиля")
+    photo_variants: List[PhotoVariants] = Field([], description="Размерные варианты фото в том же порядке, что photos")
 
     latitude: Optional[float] = Field(None, description="Широта пользователя")
     longitude: Optional[float] = Field(None, description="Долгота пользователя")
     country: Optional[str] = Field(None, description="Страна пользователя")
     city: Optional[str] = Field(None, description="Город пользователя")
     district: Optional[str] = Field(None, description="Район пользователя")
+    distance_km: Optional[float] = Field(None, description="Расстояние до пользователя (лента sort=distance)")
 
     telegram_username: Optional[str] = Field(None, description="Telegram username")
     instagram_username: Optional[str] = Field(None, description="Instagram username")
@@ -88,6 +92,7 @@ class TopUserRead(BaseModel):
     telegram_username: Optional[str]
     instagram_username: Optional[str]
     photos: List[str]
+    photo_variants: List[PhotoVariants] = []
     created_at: datetime
     likes_count: int
 
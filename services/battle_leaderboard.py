@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from bisect import bisect_left, insort
+from typing import Iterable
+
+from sqlalchemy import select, func
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.battle import Battle
+from services.battle_pool import LocationKey
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DistrictLeaderboard:
+    """
+    Победы участников одного района в отсортированном списке (-wins, user_id):
+    топ читается срезом, одна победа — удаление и вставка через bisect.
+    """
+
+    __slots__ = ("wins", "ranking")
+
+    def __init__(self, wins: dict[int, int] | None = None):
+        self.wins: dict[int, int] = dict(wins or {})
+        self.ranking: list[tuple[int, int]] = sorted((-w, uid) for uid, w in self.wins.items())
+
+    def add_win(self, user_id: int, count: int = 1) -> None:
+        current = self.wins.get(user_id, 0)
+        if current:
+            index = bisect_left(self.ranking, (-current, user_id))
+            del self.ranking[index]
+        self.wins[user_id] = current + count
+        insort(self.ranking, (-(current + count), user_id))
+
+    def top(self, limit: int) -> list[tuple[int, int]]:
+        """[(user_id, wins), ...] по убыванию побед."""
+        return [(uid, -neg_wins) for neg_wins, uid in self.ranking[:limit]]
+
+
+class BattleLeaderboard:
+    """
+    Лидерборды баттлов по районам, где сыгран баттл. Каждый записанный баттл
+    инкрементально добавляет победу; периодическая сверка с таблицей battles
+    подтягивает победы из других воркеров.
+    """
+
+    def __init__(self):
+        self._boards: dict[LocationKey, DistrictLeaderboard] = {}
+        self._locks: dict[LocationKey, asyncio.Lock] = {}
+        # Победы, пришедшие, пока район перечитывается из БД
+        self._loading: dict[LocationKey, list[int]] = {}
+        self._interval = settings.BATTLE_LEADERBOARD_RECONCILE_SECONDS
+
+    async def top(self, key: LocationKey, limit: int) -> list[tuple[int, int]]:
+        board = self._boards.get(key)
+        if board is None:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                board = self._boards.get(key)
+                if board is None:
+                    board = await self._reload(key)
+        return board.top(limit)
+
+    def apply(self, wins: Iterable[tuple[LocationKey, int]]) -> None:
+        """Учитывает победы из только что записанной пачки баттлов."""
+        for key, winner_id in wins:
+            board = self._boards.get(key)
+            if board is not None:
+                board.add_win(winner_id)
+            pending = self._loading.get(key)
+            if pending is not None:
+                pending.append(winner_id)
+
+    async def _reload(self, key: LocationKey) -> DistrictLeaderboard:
+        """
+        Перечитывает район и досчитывает победы, записанные во время чтения,
+        чтобы замена доски их не потеряла.
+        """
+        pending = self._loading[key] = []
+        try:
+            board = DistrictLeaderboard(await self._load_wins(key))
+        finally:
+            del self._loading[key]
+        for winner_id in pending:
+            board.add_win(winner_id)
+        self._boards[key] = board
+        return board
+
+    async def _load_wins(self, key: LocationKey) -> dict[int, int]:
+        country, city, district = key
+        async with AsyncSessionLocal() as db:
+            # Диапазон по ix_battles_location_winner, победы уже сгруппированы в индексе
+            result = await db.execute(
+                select(Battle.winner_id, func.count())
+                .where(
+                    Battle.country == country,
+                    Battle.city == city,
+                    Battle.district == district,
+                    Battle.winner_id.is_not(None),
+                )
+                .group_by(Battle.winner_id)
+            )
+            return {winner_id: wins for winner_id, wins in result.all()}
+
+    def drop(self, key: LocationKey) -> None:
+        """Забывает доску района: при следующем запросе она перечитается из БД."""
+        self._boards.pop(key, None)
+
+    def clear(self) -> None:
+        self._boards.clear()
+
+    async def reconcile(self) -> None:
+        for key in list(self._boards):
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                await self._reload(key)
+
+    async def run(self) -> None:
+        """Фоновая сверка загруженных лидербордов с базой."""
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.reconcile()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Сверка лидерборда баттлов завершилась ошибкой: %s", exc)
+
+
+battle_leaderboard = BattleLeaderboard()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import random
+import time
+from array import array
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.user import User
+from models.battle_rating import BattleRating, DEFAULT_RATING
+
+# (country, city, district)
+LocationKey = tuple[str, str, str]
+
+
+class _IdBucket:
+    """
+    Плотный массив id + индекс позиций: случайная выборка, добавление
+    и удаление за O(1) (удаление — перестановкой последнего элемента на место).
+    """
+
+    __slots__ = ("ids", "positions")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.positions: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, user_id: int) -> None:
+        if user_id in self.positions:
+            return
+        self.positions[user_id] = len(self.ids)
+        self.ids.append(user_id)
+
+    def remove(self, user_id: int) -> None:
+        index = self.positions.pop(user_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if index < len(self.ids):
+            self.ids[index] = last
+            self.positions[last] = index
+
+    def random_id(self) -> int:
+        return self.ids[random.randrange(len(self.ids))]
+
+
+class _District:
+    __slots__ = ("buckets", "loaded_at")
+
+    def __init__(self):
+        self.buckets: dict[Optional[str], _IdBucket] = {}
+        self.loaded_at = time.monotonic()
+
+    def bucket(self, gender: Optional[str]) -> _IdBucket:
+        bucket = self.buckets.get(gender)
+        if bucket is None:
+            bucket = self.buckets[gender] = _IdBucket()
+        return bucket
+
+
+class BattlePool:
+    """
+    Пул участников баттлов в памяти: район → пол → массив id.
+
+    Район загружается одним запросом при первом обращении и полностью
+    перечитывается раз в BATTLE_POOL_TTL_SECONDS. Между перечитываниями пул
+    поддерживается инкрементально: регистрация, смена локации или пола,
+    новые рейтинги после сброса баттлов.
+    """
+
+    def __init__(self):
+        self._districts: dict[LocationKey, _District] = {}
+        self._locks: dict[LocationKey, asyncio.Lock] = {}
+        self._ratings: dict[int, float] = {}
+        self._ttl = settings.BATTLE_POOL_TTL_SECONDS
+        self._sample_size = settings.BATTLE_PAIR_SAMPLE_SIZE
+
+    async def _district(self, key: LocationKey) -> _District:
+        district = self._districts.get(key)
+        if district is not None and time.monotonic() - district.loaded_at < self._ttl:
+            return district
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            district = self._districts.get(key)
+            if district is None or time.monotonic() - district.loaded_at >= self._ttl:
+                district = await self._load(key)
+                self._districts[key] = district
+        return district
+
+    async def _load(self, key: LocationKey) -> _District:
+        country, city, district_name = key
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User.id, User.gender, func.coalesce(BattleRating.rating, DEFAULT_RATING))
+                .outerjoin(BattleRating, BattleRating.user_id == User.id)
+                .where(
+                    User.country == country,
+                    User.city == city,
+                    User.district == district_name,
+                )
+            )
+            rows = result.all()
+
+        district = _District()
+        for user_id, gender, rating in rows:
+            district.bucket(gender).add(user_id)
+            self._ratings[user_id] = rating
+        return district
+
+    def rating(self, user_id: int) -> float:
+        return self._ratings.get(user_id, DEFAULT_RATING)
+
+    async def sample(
+        self,
+        key: LocationKey,
+        genders: Optional[list[Optional[str]]],
+        exclude: Iterable[int] = (),
+        near_rating: Optional[float] = None,
+    ) -> Optional[int]:
+        """
+        Случайный участник района нужного пола (genders=None — любого).
+
+        С near_rating берётся несколько случайных кандидатов и из них
+        выбирается ближайший по рейтингу — выборка остаётся O(1),
+        а пары получаются более равными.
+        """
+        district = await self._district(key)
+        if genders is None:
+            buckets = [b for b in district.buckets.values() if len(b)]
+        else:
+            buckets = [district.buckets[g] for g in genders if g in district.buckets and len(district.buckets[g])]
+        total = sum(len(b) for b in buckets)
+        if not total:
+            return None
+
+        excluded = set(exclude)
+        draws = self._sample_size if near_rating is not None else 1
+        picked: list[int] = []
+        # Ограничиваем число попыток: исключённых id обычно один-два
+        for _ in range(draws + len(excluded) * 2 + 2):
+            offset = random.randrange(total)
+            for bucket in buckets:
+                if offset < len(bucket):
+                    candidate = bucket.random_id()
+                    break
+                offset -= len(bucket)
+            if candidate not in excluded:
+                picked.append(candidate)
+                if len(picked) == draws:
+                    break
+
+        if not picked:
+            # Маленький район: проще перебрать всех
+            picked = [uid for b in buckets for uid in b.ids if uid not in excluded]
+            if not picked:
+                return None
+        if near_rating is None:
+            return picked[0]
+        return min(picked, key=lambda uid: abs(self.rating(uid) - near_rating))
+
+    def move(
+        self,
+        user_id: int,
+        old_key: Optional[LocationKey],
+        old_gender: Optional[str],
+        new_key: Optional[LocationKey],
+        new_gender: Optional[str],
+    ) -> None:
+        """Переносит пользователя между районами/полами в уже загруженных районах."""
+        if old_key is not None and old_key in self._districts:
+            self._districts[old_key].bucket(old_gender).remove(user_id)
+        if new_key is not None and new_key in self._districts:
+            self._districts[new_key].bucket(new_gender).add(user_id)
+
+    def update_ratings(self, ratings: dict[int, float]) -> None:
+        self._ratings.update(ratings)
+
+    def drop_district(self, key: LocationKey) -> None:
+        """Забывает район: при следующем обращении он перечитается из БД."""
+        self._districts.pop(key, None)
+
+    def clear(self) -> None:
+        self._districts.clear()
+        self._ratings.clear()
+
+
+def location_key(user: User) -> Optional[LocationKey]:
+    if not all([user.country, user.city, user.district]):
+        return None
+    return user.country, user.city, user.district
+
+
+def encode_location_key(key: LocationKey) -> str:
+    """Район строкой для шины инвалидации (названия могут содержать любые символы)."""
+    return json.dumps(list(key), ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_location_key(raw: str) -> LocationKey:
+    country, city, district = json.loads(raw)
+    return country, city, district
+
+
+battle_pool = BattlePool()
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import select, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.battle import Battle
+from models.battle_rating import BattleRating, DEFAULT_RATING
+from models.user import User
+from services.battle_pool import battle_pool, LocationKey
+from services.battle_leaderboard import battle_leaderboard
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass(frozen=True)
+class BattleOutcome:
+    winner_id: int
+    loser_id: int
+    location: LocationKey
+
+
+def elo_update(winner_rating: float, loser_rating: float, k: float) -> tuple[float, float]:
+    """Новые рейтинги (победитель, проигравший) после одного баттла."""
+    expected_win = 1.0 / (1.0 + 10 ** ((loser_rating - winner_rating) / 400.0))
+    delta = k * (1.0 - expected_win)
+    return winner_rating + delta, loser_rating - delta
+
+
+class BattleRecorder:
+    """
+    Пакетная запись исходов баттлов.
+
+    Обработчик запроса только кладёт исход в буфер. Фоновая задача раз в
+    BATTLE_FLUSH_INTERVAL_SECONDS (или при заполнении BATTLE_FLUSH_BATCH)
+    одной транзакцией вставляет строки battles и инкрементально обновляет
+    рейтинги Эло участников, не пересчитывая историю. Новые рейтинги сразу
+    попадают в пул подбора пар, победы — в лидерборд района.
+    """
+
+    def __init__(self):
+        self._buffer: list[BattleOutcome] = []
+        self._wakeup = asyncio.Event()
+        self._batch_size = settings.BATTLE_FLUSH_BATCH
+        self._interval = settings.BATTLE_FLUSH_INTERVAL_SECONDS
+        self._k = settings.BATTLE_ELO_K
+
+    def record(self, winner_id: int, loser_id: int, location: LocationKey) -> None:
+        self._buffer.append(BattleOutcome(winner_id, loser_id, location))
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        outcomes, self._buffer = self._buffer, []
+        try:
+            await self._write(outcomes)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Не удалось записать %d баттлов: %s", len(outcomes), exc)
+
+    async def _write(self, outcomes: list[BattleOutcome]) -> None:
+        try:
+            await self._write_batch(outcomes)
+        except IntegrityError:
+            # Участника удалили между проверкой и вставкой — повторяем без него
+            logger.warning("Пачка баттлов упёрлась в удалённого пользователя, повторяем")
+            await self._write_batch(outcomes)
+
+    async def _write_batch(self, outcomes: list[BattleOutcome]) -> None:
+        async with AsyncSessionLocal() as db, db.begin():
+            candidates = {uid for o in outcomes for uid in (o.winner_id, o.loser_id)}
+            existing = set((await db.execute(
+                select(User.id).where(User.id.in_(candidates))
+            )).scalars())
+            outcomes = [o for o in outcomes if o.winner_id in existing and o.loser_id in existing]
+            if not outcomes:
+                return
+            user_ids = sorted({uid for o in outcomes for uid in (o.winner_id, o.loser_id)})
+
+            # Первый баттл пользователя: создаём строку рейтинга заранее, иначе
+            # FOR UPDATE её не заблокирует и два воркера перезапишут друг друга
+            await db.execute(
+                pg_insert(BattleRating)
+                .values([
+                    {"user_id": uid, "rating": DEFAULT_RATING, "games": 0, "wins": 0}
+                    for uid in user_ids
+                ])
+                .on_conflict_do_nothing(index_elements=[BattleRating.user_id])
+            )
+            # Блокируем строки рейтингов в фиксированном порядке, чтобы параллельные
+            # сбросы из разных воркеров не теряли обновления и не ловили дедлоки
+            rows = await db.execute(
+                select(BattleRating.user_id, BattleRating.rating)
+                .where(BattleRating.user_id.in_(user_ids))
+                .order_by(BattleRating.user_id)
+                .with_for_update()
+            )
+            ratings = dict(rows.all())
+            games = dict.fromkeys(user_ids, 0)
+            wins = dict.fromkeys(user_ids, 0)
+
+            for outcome in outcomes:
+                ratings[outcome.winner_id], ratings[outcome.loser_id] = elo_update(
+                    ratings[outcome.winner_id], ratings[outcome.loser_id], self._k
+                )
+                games[outcome.winner_id] += 1
+                games[outcome.loser_id] += 1
+                wins[outcome.winner_id] += 1
+
+            # id берутся из последовательности: случайных 6 цифр мало для этой таблицы
+            await db.execute(
+                insert(Battle),
+                [
+                    {
+                        "user_id": o.winner_id,
+                        "opponent_id": o.loser_id,
+                        "winner_id": o.winner_id,
+                        "country": o.location[0],
+                        "city": o.location[1],
+                        "district": o.location[2],
+                    }
+                    for o in outcomes
+                ],
+            )
+
+            upsert = pg_insert(BattleRating).values([
+                {"user_id": uid, "rating": ratings[uid], "games": games[uid], "wins": wins[uid]}
+                for uid in user_ids
+            ])
+            await db.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=[BattleRating.user_id],
+                    set_={
+                        "rating": upsert.excluded.rating,
+                        "games": BattleRating.games + upsert.excluded.games,
+                        "wins": BattleRating.wins + upsert.excluded.wins,
+                        "updated_at": upsert.excluded.updated_at,
+                    },
+                )
+            )
+
+        battle_pool.update_ratings(ratings)
+        battle_leaderboard.apply((o.location, o.winner_id) for o in outcomes)
+
+    async def run(self) -> None:
+        """Фоновый цикл сброса буфера; при отмене дописывает остаток."""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self._interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+
+battle_recorder = BattleRecorder()
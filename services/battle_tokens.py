@@ -0,0 +1,68 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+from fastapi import HTTPException, status
+
+from core.cache import TTLCache
+from core.config import settings
+from services.battle_pool import LocationKey
+
+# Отдельный ключ, чтобы подпись пары нельзя было выдать за JWT или init_data
+_PAIR_SECRET = hmac.new(
+    key=b"BattlePair",
+    msg=settings.TELEGRAM_BOT_TOKEN.encode("utf-8"),
+    digestmod=hashlib.sha256,
+).digest()
+
+# Уже записанные пары: один показ — один голос (в пределах воркера;
+# между воркерами повтор ограничен сроком жизни токена)
+_redeemed: TTLCache[str, bool] = TTLCache(
+    maxsize=settings.BATTLE_PAIR_TOKEN_CACHE_SIZE,
+    ttl=settings.BATTLE_PAIR_TOKEN_TTL_SECONDS,
+)
+
+
+def _sign(payload: bytes) -> str:
+    digest = hmac.new(_PAIR_SECRET, payload, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def issue_pair_token(viewer_id: int, key: LocationKey, first_id: int, second_id: int) -> str:
+    """Подписанный токен показанной пары: без него исход баттла не записывается."""
+    expires_at = int(time.time()) + settings.BATTLE_PAIR_TOKEN_TTL_SECONDS
+    raw = json.dumps(
+        [viewer_id, list(key), sorted((first_id, second_id)), expires_at],
+        separators=(",", ":"),
+    ).encode("utf-8")
+    body = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+    return f"{body}.{_sign(raw)}"
+
+
+def redeem_pair_token(token: str, viewer_id: int, key: LocationKey, winner_id: int, loser_id: int) -> None:
+    """
+    Проверяет, что пару winner/loser сервер действительно показал этому
+    пользователю в его районе, и гасит токен.
+    Бросает HTTPException(400), если токен чужой, просрочен или уже использован.
+    """
+    invalid = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Некорректный токен пары")
+    try:
+        body, signature = token.split(".", 1)
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        token_viewer, token_key, pair, expires_at = json.loads(raw)
+    except (ValueError, TypeError):
+        raise invalid
+    if not hmac.compare_digest(_sign(raw), signature):
+        raise invalid
+    if (
+        token_viewer != viewer_id
+        or tuple(token_key) != key
+        or pair != sorted((winner_id, loser_id))
+        or expires_at < time.time()
+    ):
+        raise invalid
+    if _redeemed.get(signature) is not None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Исход этой пары уже записан")
+    _redeemed.set(signature, True)
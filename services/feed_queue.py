@@ -0,0 +1,357 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from typing import Optional
+
+import numpy as np
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from repos.feed import fetch_candidate_features, opposite_gender
+from services.feed_ranking import RankingWeights, rank_candidates
+from utils.pagination import encode_cursor, decode_cursor
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class FeedQueueBackend(ABC):
+    """
+    Хранилище очередей кандидатов: user_id → упорядоченный список id анкет
+    и курсор, с которого продолжать наполнение.
+    """
+
+    @abstractmethod
+    async def pop(self, user_id: int, count: int) -> list[int]:
+        """Снимает до count id из головы очереди."""
+
+    @abstractmethod
+    async def extend(self, user_id: int, ids: list[int]) -> None:
+        """Дописывает id в хвост очереди (с обрезкой до размера)."""
+
+    @abstractmethod
+    async def push_front(self, user_id: int, candidate_id: int) -> None:
+        """Ставит id в голову очереди (новый пользователь — самый свежий)."""
+
+    @abstractmethod
+    async def discard(self, user_id: int, candidate_id: int) -> None:
+        """Убирает id из очереди, если он там есть."""
+
+    @abstractmethod
+    async def size(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    async def get_cursor(self, user_id: int) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set_cursor(self, user_id: int, cursor: Optional[str]) -> None:
+        ...
+
+    @abstractmethod
+    async def drop(self, user_id: int) -> None:
+        """Полностью сбрасывает очередь и курсор пользователя."""
+
+    async def clear_local(self) -> None:
+        """Сбрасывает всё, что хранится в памяти процесса; общим бэкендам нечего сбрасывать."""
+
+    def forget(self, user_id: int) -> None:
+        """Освобождает память процесса под очередь ушедшего пользователя; в Redis её убирает TTL."""
+
+
+class InMemoryFeedQueueBackend(FeedQueueBackend):
+    """Очереди в памяти процесса. Подходит для одного воркера."""
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._queues: dict[int, deque[int]] = {}
+        self._cursors: dict[int, str] = {}
+
+    def _queue(self, user_id: int) -> deque[int]:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque(maxlen=self._capacity)
+        return queue
+
+    async def pop(self, user_id: int, count: int) -> list[int]:
+        queue = self._queues.get(user_id)
+        if not queue:
+            return []
+        return [queue.popleft() for _ in range(min(count, len(queue)))]
+
+    async def extend(self, user_id: int, ids: list[int]) -> None:
+        queue = self._queue(user_id)
+        present = set(queue)
+        for candidate_id in ids:
+            if len(queue) == queue.maxlen:
+                break
+            if candidate_id not in present:
+                queue.append(candidate_id)
+                present.add(candidate_id)
+
+    async def push_front(self, user_id: int, candidate_id: int) -> None:
+        queue = self._queue(user_id)
+        if candidate_id in queue:
+            return
+        if len(queue) == queue.maxlen:
+            queue.pop()
+        queue.appendleft(candidate_id)
+
+    async def discard(self, user_id: int, candidate_id: int) -> None:
+        queue = self._queues.get(user_id)
+        if queue is not None and candidate_id in queue:
+            queue.remove(candidate_id)
+
+    async def size(self, user_id: int) -> int:
+        queue = self._queues.get(user_id)
+        return len(queue) if queue is not None else 0
+
+    async def get_cursor(self, user_id: int) -> Optional[str]:
+        return self._cursors.get(user_id)
+
+    async def set_cursor(self, user_id: int, cursor: Optional[str]) -> None:
+        if cursor is None:
+            self._cursors.pop(user_id, None)
+        else:
+            self._cursors[user_id] = cursor
+
+    async def drop(self, user_id: int) -> None:
+        self._queues.pop(user_id, None)
+        self._cursors.pop(user_id, None)
+
+    async def clear_local(self) -> None:
+        self._queues.clear()
+        self._cursors.clear()
+
+    def forget(self, user_id: int) -> None:
+        self._queues.pop(user_id, None)
+        self._cursors.pop(user_id, None)
+
+
+class RedisFeedQueueBackend(FeedQueueBackend):
+    """
+    Общие для всех воркеров очереди в Redis (списки + ключ курсора).
+    Требует пакет redis, который ставится только вместе с этим бэкендом.
+    """
+
+    def __init__(self, url: str, capacity: int, ttl_seconds: int):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as exc:
+            raise RuntimeError("Для FEED_QUEUE_REDIS_URL нужен установленный пакет redis") from exc
+
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._capacity = capacity
+        self._ttl = ttl_seconds
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"feed:queue:{user_id}"
+
+    @staticmethod
+    def _cursor_key(user_id: int) -> str:
+        return f"feed:cursor:{user_id}"
+
+    async def pop(self, user_id: int, count: int) -> list[int]:
+        ids = await self._redis.lpop(self._key(user_id), count)
+        return [int(i) for i in ids or []]
+
+    async def extend(self, user_id: int, ids: list[int]) -> None:
+        if not ids:
+            return
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for candidate_id in ids:
+                pipe.lrem(key, 0, candidate_id)
+            pipe.rpush(key, *ids)
+            pipe.ltrim(key, 0, self._capacity - 1)
+            pipe.expire(key, self._ttl)
+            await pipe.execute()
+
+    async def push_front(self, user_id: int, candidate_id: int) -> None:
+        key = self._key(user_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.lrem(key, 0, candidate_id)
+            pipe.lpush(key, candidate_id)
+            pipe.ltrim(key, 0, self._capacity - 1)
+            await pipe.execute()
+
+    async def discard(self, user_id: int, candidate_id: int) -> None:
+        await self._redis.lrem(self._key(user_id), 0, candidate_id)
+
+    async def size(self, user_id: int) -> int:
+        return await self._redis.llen(self._key(user_id))
+
+    async def get_cursor(self, user_id: int) -> Optional[str]:
+        return await self._redis.get(self._cursor_key(user_id))
+
+    async def set_cursor(self, user_id: int, cursor: Optional[str]) -> None:
+        if cursor is None:
+            await self._redis.delete(self._cursor_key(user_id))
+        else:
+            await self._redis.set(self._cursor_key(user_id), cursor, ex=self._ttl)
+
+    async def drop(self, user_id: int) -> None:
+        await self._redis.delete(self._key(user_id), self._cursor_key(user_id))
+
+
+class FeedEngine:
+    """
+    Предрасчитанная лента: для каждого активного пользователя держим
+    ограниченную очередь id кандидатов. Чтение снимает id из головы,
+    фоновая задача доливает очередь, когда она опускается ниже порога.
+    Доливка берёт пул в FEED_RANK_POOL_FACTOR раз больше недостающего,
+    ранжирует его (services.feed_ranking) и ставит в очередь лучшие.
+    """
+
+    def __init__(self, backend: FeedQueueBackend):
+        self.backend = backend
+        self._capacity = settings.FEED_QUEUE_SIZE
+        self._refill_at = settings.FEED_QUEUE_REFILL_AT
+        self._active_ttl = settings.FEED_QUEUE_ACTIVE_TTL_SECONDS
+        self._pool_factor = max(1, settings.FEED_RANK_POOL_FACTOR)
+        self._max_active = settings.FEED_QUEUE_MAX_ACTIVE
+        self._weights = RankingWeights(
+            recency=settings.FEED_RANK_WEIGHT_RECENCY,
+            photos=settings.FEED_RANK_WEIGHT_PHOTOS,
+            popularity=settings.FEED_RANK_WEIGHT_POPULARITY,
+            seen_penalty=settings.FEED_RANK_SEEN_PENALTY,
+            recency_half_life_hours=settings.FEED_RANK_RECENCY_HALF_LIFE_HOURS,
+            seen_half_life_hours=settings.FEED_RANK_SEEN_HALF_LIFE_HOURS,
+        )
+        # user_id → (пол, время последнего запроса ленты) для активных пользователей
+        # этого воркера; порядок — от давно неактивных к недавним
+        self._active: OrderedDict[int, tuple[Optional[str], float]] = OrderedDict()
+        self._pending: asyncio.Queue[int] = asyncio.Queue()
+        self._scheduled: set[int] = set()
+
+    async def next_ids(self, user_id: int, gender: Optional[str], count: int) -> list[int]:
+        """
+        Отдаёт следующие count id для ленты пользователя.
+        Холодная очередь наполняется синхронно, дальше — в фоне.
+        """
+        self._active[user_id] = (gender, time.monotonic())
+        self._active.move_to_end(user_id)
+        self._expire_inactive()
+
+        ids = await self.backend.pop(user_id, count)
+        if len(ids) < count:
+            await self.refill(user_id, gender)
+            ids += await self.backend.pop(user_id, count - len(ids))
+
+        if await self.backend.size(user_id) < self._refill_at:
+            self.schedule_refill(user_id)
+        return ids
+
+    async def refill(self, user_id: int, gender: Optional[str]) -> None:
+        """
+        Доливает очередь до ёмкости, продолжая с сохранённого курсора.
+        Курсор уходит за весь пул: не попавшие в очередь кандидаты пула
+        вернутся на следующем круге ленты и снова поборются за место.
+        """
+        missing = self._capacity - await self.backend.size(user_id)
+        if missing <= 0:
+            return
+
+        pool = missing * self._pool_factor
+        cursor = await self.backend.get_cursor(user_id)
+        after = decode_cursor(cursor) if cursor else None
+        async with AsyncSessionLocal() as db:
+            rows = await fetch_candidate_features(db, user_id, gender, pool, after)
+
+        if rows:
+            await self.backend.extend(user_id, self._rank(rows, missing))
+        if len(rows) < pool:
+            # Дошли до конца — следующий круг ленты начнётся с самых новых анкет
+            await self.backend.set_cursor(user_id, None)
+        else:
+            last_id, last_created_at = rows[-1][0], rows[-1][1]
+            await self.backend.set_cursor(user_id, encode_cursor(last_created_at, last_id))
+
+    def _rank(self, rows: list[tuple], limit: int) -> list[int]:
+        """Лучшие limit кандидатов пула по скору ранжирования."""
+        ids, created_at, photo_counts, like_counts, last_viewed_at = zip(*rows)
+        return rank_candidates(
+            np.fromiter(ids, dtype=np.int64, count=len(rows)),
+            np.fromiter((ts.timestamp() for ts in created_at), dtype=np.float64, count=len(rows)),
+            np.fromiter(photo_counts, dtype=np.float64, count=len(rows)),
+            np.fromiter(like_counts, dtype=np.float64, count=len(rows)),
+            np.fromiter(
+                (ts.timestamp() if ts is not None else np.nan for ts in last_viewed_at),
+                dtype=np.float64,
+                count=len(rows),
+            ),
+            time.time(),
+            self._weights,
+            limit=limit,
+        )
+
+    def schedule_refill(self, user_id: int) -> None:
+        if user_id not in self._scheduled:
+            self._scheduled.add(user_id)
+            self._pending.put_nowait(user_id)
+
+    async def on_like(self, liker_id: int, liked_id: int) -> None:
+        await self.backend.discard(liker_id, liked_id)
+
+    async def on_match(self, user1_id: int, user2_id: int) -> None:
+        await self.backend.discard(user1_id, user2_id)
+        await self.backend.discard(user2_id, user1_id)
+
+    async def on_new_user(self, user_id: int, gender: Optional[str]) -> None:
+        """
+        Новый пользователь сразу попадает в головы очередей подходящих активных.
+        Видны только активные этого воркера: зрители, которых обслуживают другие
+        воркеры, получат анкету при обычной доливке очереди.
+        """
+        self._expire_inactive()
+        for viewer_id, (viewer_gender, _) in list(self._active.items()):
+            if viewer_id == user_id:
+                continue
+            wanted = opposite_gender(viewer_gender)
+            if wanted is None or wanted == gender:
+                await self.backend.push_front(viewer_id, user_id)
+
+    async def invalidate(self, user_id: int) -> None:
+        await self.backend.drop(user_id)
+
+    async def clear_local(self) -> None:
+        await self.backend.clear_local()
+
+    def _expire_inactive(self) -> None:
+        """Забывает неактивных дольше TTL и самых давних сверх FEED_QUEUE_MAX_ACTIVE."""
+        deadline = time.monotonic() - self._active_ttl
+        while self._active:
+            viewer_id, (_, seen_at) = next(iter(self._active.items()))
+            if seen_at >= deadline and len(self._active) <= self._max_active:
+                break
+            del self._active[viewer_id]
+            self.backend.forget(viewer_id)
+
+    async def run(self) -> None:
+        """Фоновый цикл доливки очередей."""
+        while True:
+            user_id = await self._pending.get()
+            self._scheduled.discard(user_id)
+            active = self._active.get(user_id)
+            if active is None:
+                continue
+            try:
+                await self.refill(user_id, active[0])
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Не удалось пополнить очередь ленты %s: %s", user_id, exc)
+
+
+def _build_backend() -> FeedQueueBackend:
+    if settings.FEED_QUEUE_REDIS_URL:
+        return RedisFeedQueueBackend(
+            settings.FEED_QUEUE_REDIS_URL,
+            settings.FEED_QUEUE_SIZE,
+            settings.FEED_QUEUE_ACTIVE_TTL_SECONDS,
+        )
+    return InMemoryFeedQueueBackend(settings.FEED_QUEUE_SIZE)
+
+
+feed_engine = FeedEngine(_build_backend())
@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Сколько фото считаем «полным» профилем (совпадает с MAX_PHOTOS)
+FULL_PROFILE_PHOTOS = 6
+
+
+@dataclass(frozen=True)
+class RankingWeights:
+    """
+    Веса ранжирования ленты. Итоговый скор кандидата:
+
+        recency * свежесть + photos * заполненность фото
+        + popularity * популярность − seen_penalty * недавний просмотр
+    """
+    recency: float = 1.0
+    photos: float = 0.3
+    popularity: float = 0.5
+    seen_penalty: float = 1.5
+    recency_half_life_hours: float = 72.0
+    seen_half_life_hours: float = 24.0
+
+
+def score_candidates(
+    created_at_ts: np.ndarray,
+    photo_counts: np.ndarray,
+    like_counts: np.ndarray,
+    last_viewed_ts: np.ndarray,
+    now_ts: float,
+    weights: RankingWeights,
+) -> np.ndarray:
+    """
+    Считает скор всей пачки кандидатов одним векторным проходом.
+
+    Все массивы одной длины; время — unix timestamp в секундах.
+    В last_viewed_ts NaN означает «текущий пользователь эту анкету не видел».
+    """
+    # Экспоненциальные затухания считаем через exp2 с заранее поделёнными периодами
+    recency = np.exp2((created_at_ts - now_ts) / (3600.0 * weights.recency_half_life_hours))
+    np.minimum(recency, 1.0, out=recency)
+
+    photos = np.minimum(photo_counts, FULL_PROFILE_PHOTOS) * (1.0 / FULL_PROFILE_PHOTOS)
+
+    log_likes = np.log1p(like_counts)
+    top = log_likes.max(initial=0.0)
+    popularity_weight = weights.popularity / top if top > 0 else 0.0
+
+    # Для непросмотренных анкет (NaN) штраф обнуляем
+    seen = np.exp2((last_viewed_ts - now_ts) / (3600.0 * weights.seen_half_life_hours))
+    np.minimum(seen, 1.0, out=seen)
+    seen[np.isnan(seen)] = 0.0
+
+    scores = recency
+    scores *= weights.recency
+    scores += weights.photos * photos
+    scores += popularity_weight * log_likes
+    scores -= weights.seen_penalty * seen
+    return scores
+
+
+def rank_candidates(
+    ids: np.ndarray,
+    created_at_ts: np.ndarray,
+    photo_counts: np.ndarray,
+    like_counts: np.ndarray,
+    last_viewed_ts: np.ndarray,
+    now_ts: float,
+    weights: RankingWeights,
+    limit: int | None = None,
+) -> list[int]:
+    """
+    Возвращает до limit id кандидатов по убыванию скора
+    (при равенстве — в исходном порядке пачки).
+    """
+    if ids.size == 0:
+        return []
+    scores = score_candidates(created_at_ts, photo_counts, like_counts, last_viewed_ts, now_ts, weights)
+    if limit is not None and limit < ids.size:
+        # Частичный отбор top-k дешевле полной сортировки пачки
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        order = top[np.lexsort((top, -scores[top]))]
+    else:
+        order = np.argsort(-scores, kind="stable")
+    return ids[order].tolist()
+
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Iterable, Optional
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from utils.image_tools import PHOTO_VARIANTS, compress_image_variants_to_files
+from utils.s3 import build_image_key, delete_file_from_s3, put_file_to_s3, variant_key
+from utils.upload_limits import spool_to_disk
+
+logger = logging.getLogger("uvicorn.error")
+
+STAGES = ("spool", "decode", "resize", "rotate", "encode", "upload")
+
+
+class _StageStats:
+    __slots__ = ("count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class ImageProcessor:
+    """
+    Сжатие фотографий в отдельном пуле процессов.
+
+    Pillow-работа не занимает ни event loop, ни GIL основного процесса.
+    Одновременно обрабатывается не больше IMAGE_POOL_MAX_IN_FLIGHT файлов;
+    остальные ждут слота до IMAGE_POOL_QUEUE_TIMEOUT_SECONDS и получают 503.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(settings.IMAGE_POOL_MAX_IN_FLIGHT)
+        self._in_flight = 0
+        self._rejected = 0
+        self._stages = {stage: _StageStats() for stage in STAGES}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_POOL_WORKERS or os.cpu_count() or 1,
+                # fork из процесса с потоками и открытыми соединениями небезопасен
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def _acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), settings.IMAGE_POOL_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен обработкой фото, попробуйте позже",
+                headers={"Retry-After": "5"},
+            )
+
+    async def compress(self, src_path: str) -> tuple[dict[str, str], str]:
+        """
+        Готовит размерные варианты изображения с диска в пуле процессов.
+        Возвращает ({variant: путь к временному файлу}, ext).
+        ValueError — не изображение.
+        """
+        await self._acquire()
+        self._in_flight += 1
+        executor = self._pool()
+        try:
+            loop = asyncio.get_running_loop()
+            paths, ext, timings = await loop.run_in_executor(
+                executor, compress_image_variants_to_files, src_path
+            )
+        except BrokenProcessPool as exc:
+            # Воркер упал (например, OOM на огромном файле) — пересоздадим пул.
+            # Остальные задачи сломанного пула тоже получат BrokenProcessPool:
+            # сбрасываем пул, только если его ещё не заменили новым
+            if self._executor is executor:
+                logger.exception("Пул обработки фото сломан, пересоздаём: %s", exc)
+                self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Не удалось обработать фото, попробуйте позже",
+            )
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+        for stage, elapsed_ms in timings.items():
+            self._stages[stage].add(elapsed_ms)
+        return paths, ext
+
+    async def upload_image(self, file_like: BinaryIO, file_name: str, bucket_name: str) -> str:
+        """
+        Сжимает фото, кладёт все варианты в S3 параллельно и возвращает
+        s3_key варианта full (ключи остальных выводятся через variant_key).
+
+        Загрузка копируется на диск с лимитом UPLOAD_MAX_FILE_BYTES, воркер
+        читает её оттуда и пишет варианты в файлы — в памяти процесса
+        остаются только буферы копирования и части multipart.
+        """
+        started = time.perf_counter()
+        src_path = await run_in_threadpool(spool_to_disk, file_like)
+        self._stages["spool"].add((time.perf_counter() - started) * 1000)
+        try:
+            return await self.upload_image_file(src_path, file_name, bucket_name)
+        finally:
+            _remove_quietly(src_path)
+
+    async def upload_image_file(self, src_path: str, file_name: str, bucket_name: str) -> str:
+        """Как upload_image, но исходник уже лежит на диске; сам файл не удаляется."""
+        paths: dict[str, str] = {}
+        try:
+            paths, ext = await self.compress(src_path)
+            s3_key = build_image_key(file_name, ext)
+            started = time.perf_counter()
+            results = await asyncio.gather(*[
+                run_in_threadpool(put_file_to_s3, path, variant_key(s3_key, name), ext, bucket_name)
+                for name, path in paths.items()
+            ], return_exceptions=True)
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                # Часть вариантов могла успеть загрузиться — не оставляем сирот
+                await self.discard([s3_key], bucket_name)
+                raise errors[0]
+            self._stages["upload"].add((time.perf_counter() - started) * 1000)
+        finally:
+            for path in paths.values():
+                _remove_quietly(path)
+        return s3_key
+
+    async def upload_images(
+        self,
+        files: list[tuple[BinaryIO, str]],
+        bucket_name: str,
+    ) -> list[str]:
+        """
+        Загружает пачку фото параллельно, не больше PHOTO_UPLOAD_CONCURRENCY
+        за раз, и возвращает s3_key в порядке files.
+
+        Всё или ничего: если хотя бы одно фото не загрузилось, уже загруженные
+        удаляются из S3 и пробрасывается первая ошибка.
+        """
+        slots = asyncio.Semaphore(settings.PHOTO_UPLOAD_CONCURRENCY)
+
+        async def upload(file_like: BinaryIO, file_name: str) -> str:
+            async with slots:
+                return await self.upload_image(file_like, file_name, bucket_name)
+
+        results = await asyncio.gather(
+            *[upload(file_like, file_name) for file_like, file_name in files],
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            await self.discard([r for r in results if isinstance(r, str)], bucket_name)
+            raise errors[0]
+        return results
+
+    async def discard(self, s3_keys: Iterable[str], bucket_name: str) -> None:
+        """Удаляет из S3 все варианты фото; ошибки удаления только логируются."""
+        keys = [variant_key(s3_key, variant) for s3_key in s3_keys for variant in PHOTO_VARIANTS]
+        results = await asyncio.gather(
+            *[run_in_threadpool(delete_file_from_s3, key, bucket_name) for key in keys],
+            return_exceptions=True,
+        )
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                logger.error("Не удалось удалить %s из S3: %s", key, result)
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": self._in_flight,
+            "max_in_flight": settings.IMAGE_POOL_MAX_IN_FLIGHT,
+            "rejected": self._rejected,
+            "stages": {stage: stats.as_dict() for stage, stats in self._stages.items()},
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+image_processor = ImageProcessor()
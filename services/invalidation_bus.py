@@ -0,0 +1,152 @@
+import asyncio
+import inspect
+import logging
+from typing import Any, Callable
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+CHANNEL = "cache_invalidation"
+
+# Ключ, по которому кэш сбрасывается целиком
+FLUSH_KEY = "*"
+
+_NOTIFY = text("SELECT pg_notify(:channel, :payload)")
+
+
+class _Cache:
+    __slots__ = ("invalidate", "flush")
+
+    def __init__(self, invalidate: Callable[[str], Any], flush: Callable[[], Any]):
+        self.invalidate = invalidate
+        self.flush = flush
+
+
+class InvalidationBus:
+    """
+    Шина инвалидации in-process кэшей между воркерами через Postgres NOTIFY.
+
+    Изменение публикуется в транзакции вызывающего кода как "<кэш>:<ключ>"
+    и доставляется только после её коммита. Каждый воркер слушает канал
+    на одном выделенном соединении asyncpg и сбрасывает у себя ключ.
+    Пока соединения нет, уведомления теряются, поэтому при обрыве и после
+    переподключения зарегистрированные кэши сбрасываются целиком.
+    """
+
+    def __init__(self):
+        self._caches: dict[str, _Cache] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._connected = False
+        self._stats = {"received": 0, "published": 0, "reconnects": 0, "full_flushes": 0}
+
+    def register(self, name: str, invalidate: Callable[[str], Any], flush: Callable[[], Any]) -> None:
+        """invalidate(key) и flush() могут быть обычными функциями или корутинами."""
+        self._caches[name] = _Cache(invalidate, flush)
+
+    async def publish(self, db: AsyncSession, name: str, key: Any) -> None:
+        """Ставит уведомление в текущую транзакцию db; уйдёт при коммите."""
+        if not settings.INVALIDATION_BUS_ENABLED:
+            return
+        await db.execute(_NOTIFY, {"channel": CHANNEL, "payload": f"{name}:{key}"})
+        self._stats["published"] += 1
+
+    async def publish_flush_all(self, db: AsyncSession) -> None:
+        """Просит все воркеры сбросить зарегистрированные кэши целиком (после коммита db)."""
+        for name in self._caches:
+            await self.publish(db, name, FLUSH_KEY)
+
+    def flush_local(self) -> None:
+        """Сбрасывает зарегистрированные кэши этого воркера целиком."""
+        self._flush_all()
+
+    def metrics(self) -> dict:
+        return {"connected": self._connected, **self._stats}
+
+    def _call(self, func: Callable, *args) -> None:
+        try:
+            result = func(*args)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Ошибка инвалидации кэша: %s", exc)
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        self._stats["received"] += 1
+        name, _, key = payload.partition(":")
+        cache = self._caches.get(name)
+        if cache is None:
+            return
+        if key == FLUSH_KEY:
+            self._call(cache.flush)
+        else:
+            self._call(cache.invalidate, key)
+
+    def _flush_all(self) -> None:
+        self._stats["full_flushes"] += 1
+        for cache in self._caches.values():
+            self._call(cache.flush)
+
+    @staticmethod
+    def _dsn() -> str:
+        # asyncpg принимает обычный postgresql:// DSN без драйвера SQLAlchemy
+        url = make_url(settings.DATABASE_URL).set(drivername="postgresql")
+        return url.render_as_string(hide_password=False)
+
+    async def _listen(self, conn: asyncpg.Connection) -> None:
+        lost = asyncio.Event()
+        conn.add_termination_listener(lambda _conn: lost.set())
+        await conn.add_listener(CHANNEL, self._on_notify)
+        self._connected = True
+        while not lost.is_set():
+            try:
+                await asyncio.wait_for(lost.wait(), settings.INVALIDATION_BUS_PING_SECONDS)
+            except asyncio.TimeoutError:
+                # Полуоткрытое соединение иначе не заметить
+                await conn.fetchval("SELECT 1", timeout=settings.INVALIDATION_BUS_PING_SECONDS)
+
+    async def run(self) -> None:
+        """Держит LISTEN-соединение и переподключается с экспоненциальной паузой."""
+        if not settings.INVALIDATION_BUS_ENABLED:
+            return
+        delay = 1.0
+        first = True
+        while True:
+            try:
+                conn = await asyncpg.connect(self._dsn())
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Шина инвалидации: не удалось подключиться (%s), повтор через %.0f с", exc, delay)
+                first = False
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+
+            if not first:
+                # Пока слушателя не было, чужие изменения могли пройти мимо
+                self._stats["reconnects"] += 1
+                self._flush_all()
+            first = False
+            delay = 1.0
+            try:
+                await self._listen(conn)
+                logger.warning("Шина инвалидации: соединение закрыто, переподключаемся")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:  # noqa: BLE001
+                logger.warning("Шина инвалидации: соединение потеряно: %s", exc)
+            finally:
+                self._connected = False
+                if not conn.is_closed():
+                    conn.terminate()
+            self._flush_all()
+
+
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, func
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.photo import Photo
+from models.photo_upload import UPLOAD_DONE, UPLOAD_FAILED, UPLOAD_REJECTED
+from repos.photo_uploads import delete_old_uploads, set_upload_status
+from services.image_pool import image_processor
+from utils.s3 import STAGING_BUCKET, STAGING_PREFIX, delete_file_from_s3, download_from_s3, list_stale_objects
+
+logger = logging.getLogger("uvicorn.error")
+
+
+@dataclass(frozen=True)
+class IngestJob:
+    user_id: int
+    staging_key: str
+
+
+class PhotoIngestQueue:
+    """
+    Фоновая обработка фото, загруженных клиентом напрямую в S3.
+
+    Подтверждённый staging-объект ставится в ограниченную очередь;
+    PHOTO_INGEST_WORKERS обработчиков скачивают его во временный файл, готовят
+    варианты через image_processor, пишут строку Photo и удаляют исходник.
+    Итог пишется в photo_uploads: done, rejected или failed. Задания,
+    не обработанные из-за остановки или временного сбоя, теряются, но
+    staging-объект остаётся — клиент может подтвердить его повторно.
+    Брошенные исходники и старые статусы раз в PHOTO_STAGING_CLEANUP_SECONDS
+    удаляются, даже если на бакете нет правила жизненного цикла.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[IngestJob] = asyncio.Queue(maxsize=settings.PHOTO_INGEST_QUEUE_SIZE)
+        self._processed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._last_ms = 0.0
+        self._max_ms = 0.0
+
+    def enqueue(self, job: IngestJob) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен обработкой фото, попробуйте позже",
+                headers={"Retry-After": "5"},
+            )
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "processed": self._processed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "last_ms": round(self._last_ms, 2),
+            "max_ms": round(self._max_ms, 2),
+        }
+
+    async def process(self, job: IngestJob) -> None:
+        bucket = settings.AWS_S3_BUCKET_NAME
+        fd, path = tempfile.mkstemp(prefix="staging_")
+        os.close(fd)
+        try:
+            await run_in_threadpool(download_from_s3, job.staging_key, STAGING_BUCKET, path)
+            s3_key = await image_processor.upload_image_file(path, str(job.user_id), bucket)
+            try:
+                async with AsyncSessionLocal() as db:
+                    # Лимит проверялся при подтверждении, но задания одного
+                    # пользователя могли обогнать друг друга
+                    total = (await db.execute(
+                        select(func.count(Photo.id)).where(Photo.user_id == job.user_id)
+                    )).scalar_one()
+                    if total >= settings.MAX_PHOTOS:
+                        raise ValueError(f"Нельзя иметь более {settings.MAX_PHOTOS} фото")
+                    photo = Photo(user_id=job.user_id, s3_key=s3_key, is_general=False, has_variants=True)
+                    db.add(photo)
+                    await db.flush()
+                    await set_upload_status(db, job.staging_key, UPLOAD_DONE, photo_id=photo.id)
+                    await db.commit()
+            except BaseException:
+                await image_processor.discard([s3_key], bucket)
+                raise
+        except ValueError as exc:
+            # Не изображение или лимит фото — повторять бессмысленно. При сбоях
+            # S3/БД и остановке приложения исходник остаётся для повторного подтверждения
+            await self._drop_staging(job.staging_key)
+            await self._set_status(job.staging_key, UPLOAD_REJECTED, str(exc))
+            raise
+        except Exception as exc:  # noqa: BLE001
+            await self._set_status(job.staging_key, UPLOAD_FAILED, str(exc))
+            raise
+        else:
+            await self._drop_staging(job.staging_key)
+        finally:
+            os.unlink(path)
+
+    @staticmethod
+    async def _set_status(key: str, status: str, error: str) -> None:
+        try:
+            async with AsyncSessionLocal() as db:
+                await set_upload_status(db, key, status, error=error)
+                await db.commit()
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Не удалось сохранить статус загрузки %s: %s", key, exc)
+
+    @staticmethod
+    async def _drop_staging(key: str) -> None:
+        try:
+            await run_in_threadpool(delete_file_from_s3, key, STAGING_BUCKET)
+        except Exception as exc:  # noqa: BLE001
+            logger.error("Не удалось удалить %s из S3: %s", key, exc)
+
+    async def cleanup(self) -> None:
+        """Удаляет брошенные исходники и статусы старше PHOTO_STAGING_MAX_AGE_SECONDS."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.PHOTO_STAGING_MAX_AGE_SECONDS)
+        keys = await run_in_threadpool(list_stale_objects, STAGING_PREFIX, STAGING_BUCKET, cutoff)
+        for key in keys:
+            await self._drop_staging(key)
+        async with AsyncSessionLocal() as db:
+            rows = await delete_old_uploads(db, cutoff)
+            await db.commit()
+        if keys or rows:
+            logger.info("Очистка staging: %d исходников, %d статусов загрузок", len(keys), rows)
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            try:
+                await self.cleanup()
+            except Exception as exc:  # noqa: BLE001
+                logger.error("Не удалось очистить staging: %s", exc)
+            await asyncio.sleep(settings.PHOTO_STAGING_CLEANUP_SECONDS)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                await self.process(job)
+            except Exception as exc:  # noqa: BLE001
+                self._failed += 1
+                logger.exception("Не удалось обработать фото %s: %s", job.staging_key, exc)
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._processed += 1
+            self._last_ms = elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+
+    async def run(self) -> None:
+        """Фоновые обработчики очереди и очистка staging; при отмене сообщает о потерянных заданиях."""
+        try:
+            await asyncio.gather(
+                self._cleanup_loop(),
+                *[self._worker() for _ in range(settings.PHOTO_INGEST_WORKERS)],
+            )
+        except asyncio.CancelledError:
+            if not self._queue.empty():
+                logger.warning("Остановка: не обработано %d загруженных фото", self._queue.qsize())
+            raise
+
+
+photo_ingest = PhotoIngestQueue()
@@ -1,8 +1,23 @@
+import asyncio
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Optional
+
 from aiogram import Bot, Dispatcher, types
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
 from aiogram.filters import CommandStart
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+from sqlalchemy import BigInteger, delete, update, func, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
 
 from core.config import settings
+from core.database import AsyncSessionLocal
+from models.pending_notification import PendingNotification
+
+logger = logging.getLogger("uvicorn.error")
 
 
 BASE_URL = settings.MINI_APP_BASE_URL.rstrip("/")
@@ -38,19 +53,327 @@ async def cmd_start(message: types.Message) -> None:
     await message.answer(text, reply_markup=feed_keyboard)
 
 
-async def send_like_notification(chat_id: int) -> None:
-    await bot.send_message(
-        chat_id,
-        "Кому-то понравился твой профиль ❤️ Узнай, кто это",
-        reply_markup=likes_keyboard,
-    )
+LIKE_TEXT = "Кому-то понравился твой профиль ❤️ Узнай, кто это"
+MATCH_TEXT = "Совпадение! 🔥 У вас взаимный интерес — начни общение"
 
-async def send_match_notification(chat_id: int) -> None:
-    await bot.send_message(
-        chat_id,
-        "Совпадение! 🔥 У вас взаимный интерес — начни общение",
-        reply_markup=likes_keyboard,
-    )
+
+def _plural(n: int, one: str, few: str, many: str) -> str:
+    if n % 10 == 1 and n % 100 != 11:
+        return one
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return few
+    return many
+
+
+def _likes_text(count: int) -> str:
+    if count == 1:
+        return LIKE_TEXT
+    return f"Твой профиль понравился {count} {_plural(count, 'человеку', 'людям', 'людям')} ❤️ Узнай, кто это"
+
+
+def _matches_text(count: int) -> str:
+    if count == 1:
+        return MATCH_TEXT
+    noun = _plural(count, "новое совпадение", "новых совпадения", "новых совпадений")
+    return f"У тебя {count} {noun} 🔥 Начни общение"
+
+
+class TokenBucket:
+    """rate токенов в секунду, в запасе не больше capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 — уже есть)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+@dataclass
+class _Pending:
+    likes: int = 0
+    matches: int = 0
+    due: float = 0.0
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """
+    Очередь уведомлений о лайках и матчах с учётом лимитов Telegram.
+
+    На каждый чат хранится одна запись со счётчиками: лайки, пришедшие
+    в течение NOTIFY_COALESCE_SECONDS или пока чат упирается в свой
+    токен-бакет, уходят одним сообщением «N людям понравился профиль».
+    Отправку ограничивают общий бакет бота и бакет чата; на 429 вся
+    отправка ставится на паузу на retry_after.
+
+    Каждое уведомление дописывается в pending_notifications не позже чем
+    через NOTIFY_FLUSH_SECONDS, а вычитается оттуда только после ответа
+    Telegram, поэтому падение процесса теряет не больше этого окна. Свои
+    строки диспетчер продлевает при каждой записи; строки, не обновлявшиеся
+    NOTIFY_STALE_SECONDS (процесс-владелец умер), забирает себе любой живой.
+    """
+
+    def __init__(self):
+        self._pending: dict[int, _Pending] = {}
+        # Изменения счётчиков (лайки, матчи), ещё не записанные в базу
+        self._unsaved: dict[int, list[int]] = {}
+        self._schedule: list[tuple[float, int]] = []
+        self._wakeup = asyncio.Event()
+        self._max_pending = settings.NOTIFY_MAX_PENDING_CHATS
+        self._coalesce = settings.NOTIFY_COALESCE_SECONDS
+        self._global = TokenBucket(settings.NOTIFY_GLOBAL_RATE, settings.NOTIFY_GLOBAL_RATE)
+        self._chat_buckets: dict[int, TokenBucket] = {}
+        self._paused_until = 0.0
+        self._stats = {"sent": 0, "coalesced": 0, "dropped": 0, "retries": 0, "failed": 0}
+
+    def notify_like(self, chat_id: int) -> None:
+        self._add(chat_id, likes=1, delay=self._coalesce)
+
+    def notify_match(self, chat_id: int) -> None:
+        self._add(chat_id, matches=1)
+
+    def _add(
+        self, chat_id: int, likes: int = 0, matches: int = 0, delay: float = 0.0, track: bool = True
+    ) -> None:
+        due = time.monotonic() + delay
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            if len(self._pending) >= self._max_pending:
+                self._stats["dropped"] += 1
+                logger.warning("Очередь уведомлений переполнена, уведомление для %s отброшено", chat_id)
+                return
+            pending = self._pending[chat_id] = _Pending()
+            self._schedule_at(chat_id, pending, due)
+        else:
+            self._stats["coalesced"] += 1
+            if due < pending.due:
+                self._schedule_at(chat_id, pending, due)
+        pending.likes += likes
+        pending.matches += matches
+        if track:
+            self._track(chat_id, likes, matches)
+
+    def _track(self, chat_id: int, likes: int, matches: int) -> None:
+        delta = self._unsaved.setdefault(chat_id, [0, 0])
+        delta[0] += likes
+        delta[1] += matches
+
+    def _drop(self, chat_id: int) -> None:
+        pending = self._pending.pop(chat_id)
+        self._track(chat_id, -pending.likes, -pending.matches)
+
+    def _schedule_at(self, chat_id: int, pending: _Pending, due: float) -> None:
+        # Старые записи расписания не удаляются, а пропускаются по несовпадению due
+        pending.due = due
+        heapq.heappush(self._schedule, (due, chat_id))
+        self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= 2 * self._max_pending:
+                self._chat_buckets = {
+                    cid: b for cid, b in self._chat_buckets.items()
+                    if cid in self._pending or not b.is_full(now)
+                }
+            bucket = self._chat_buckets[chat_id] = TokenBucket(
+                settings.NOTIFY_PER_CHAT_PER_MINUTE / 60.0,
+                settings.NOTIFY_PER_CHAT_BURST,
+            )
+        return bucket
+
+    def metrics(self) -> dict:
+        return {
+            **self._stats,
+            "pending_chats": len(self._pending),
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 1),
+        }
+
+    async def _wait(self, timeout: Optional[float]) -> None:
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _dispatch(self) -> None:
+        while True:
+            if not self._schedule:
+                await self._wait(None)
+                continue
+            now = time.monotonic()
+            due, chat_id = self._schedule[0]
+            wait = max(due, self._paused_until, now + self._global.delay(now)) - now
+            if wait > 0:
+                await self._wait(wait)
+                continue
+
+            heapq.heappop(self._schedule)
+            pending = self._pending.get(chat_id)
+            if pending is None or pending.due != due:
+                continue
+            chat_bucket = self._chat_bucket(chat_id, now)
+            chat_delay = chat_bucket.delay(now)
+            if chat_delay > 0:
+                # Пока чат ждёт свой токен, новые лайки копятся в той же записи
+                self._schedule_at(chat_id, pending, now + chat_delay)
+                continue
+            self._global.take(now)
+            chat_bucket.take(now)
+            await self._send(chat_id, pending)
+
+    async def _send(self, chat_id: int, pending: _Pending) -> None:
+        # Сначала матчи, лайки — следующим сообщением
+        if pending.matches:
+            sent_matches, sent_likes = pending.matches, 0
+            text = _matches_text(sent_matches)
+        else:
+            sent_matches, sent_likes = 0, pending.likes
+            text = _likes_text(sent_likes)
+
+        try:
+            await bot.send_message(chat_id, text, reply_markup=likes_keyboard)
+        except TelegramRetryAfter as exc:
+            self._stats["retries"] += 1
+            self._paused_until = time.monotonic() + exc.retry_after
+            self._schedule_at(chat_id, pending, self._paused_until)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as exc:
+            # Бот заблокирован или чат не существует — повтор не поможет
+            self._stats["failed"] += 1
+            self._drop(chat_id)
+            logger.info("Уведомление для %s не доставлено: %s", chat_id, exc)
+            return
+        except Exception as exc:  # noqa: BLE001
+            pending.attempts += 1
+            if pending.attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+                self._stats["failed"] += 1
+                self._drop(chat_id)
+                logger.exception("Не удалось отправить уведомление %s: %s", chat_id, exc)
+            else:
+                self._stats["retries"] += 1
+                self._schedule_at(chat_id, pending, time.monotonic() + 2 ** pending.attempts)
+            return
+
+        self._stats["sent"] += 1
+        pending.attempts = 0
+        # За время отправки могли прийти новые лайки — вычитаем только отправленное
+        pending.matches -= sent_matches
+        pending.likes -= sent_likes
+        self._track(chat_id, -sent_likes, -sent_matches)
+        if pending.likes or pending.matches:
+            self._schedule_at(chat_id, pending, time.monotonic())
+        else:
+            del self._pending[chat_id]
+        # Отправка подтверждена — сразу вычитаем её из базы
+        await self._save(touch=False)
+
+    async def adopt(self) -> None:
+        """Забирает строки, которые давно не продлевал ни один процесс."""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                update(PendingNotification)
+                .where(PendingNotification.updated_at < func.now() - timedelta(seconds=settings.NOTIFY_STALE_SECONDS))
+                .values(updated_at=func.now())
+                .returning(
+                    PendingNotification.chat_id,
+                    PendingNotification.likes,
+                    PendingNotification.matches,
+                )
+            )).all()
+            await db.commit()
+        for chat_id, likes, matches in rows:
+            if likes > 0 or matches > 0:
+                self._add(chat_id, likes=max(likes, 0), matches=max(matches, 0), track=False)
+
+    async def flush(self, touch: bool = True) -> None:
+        """Записывает накопленные изменения счётчиков; touch — заодно продлевает свои строки."""
+        deltas, self._unsaved = self._unsaved, {}
+        rows = [
+            {"chat_id": chat_id, "likes": likes, "matches": matches}
+            for chat_id, (likes, matches) in deltas.items()
+            if likes or matches
+        ]
+        touch = touch and bool(self._pending)
+        if not rows and not touch:
+            return
+        try:
+            async with AsyncSessionLocal() as db:
+                if rows:
+                    stmt = pg_insert(PendingNotification)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=[PendingNotification.chat_id],
+                        set_={
+                            "likes": PendingNotification.likes + stmt.excluded.likes,
+                            "matches": PendingNotification.matches + stmt.excluded.matches,
+                            "updated_at": func.now(),
+                        },
+                    )
+                    await db.execute(stmt, rows)
+                    await db.execute(delete(PendingNotification).where(
+                        PendingNotification.chat_id.in_([row["chat_id"] for row in rows]),
+                        PendingNotification.likes <= 0,
+                        PendingNotification.matches <= 0,
+                    ))
+                if touch:
+                    await db.execute(
+                        update(PendingNotification)
+                        .where(PendingNotification.chat_id == any_(
+                            bindparam("chat_ids", list(self._pending), type_=ARRAY(BigInteger))
+                        ))
+                        .values(updated_at=func.now())
+                    )
+                await db.commit()
+        except BaseException:
+            # Не записалось (в том числе при отмене) — изменения остаются до следующей попытки
+            for chat_id, (likes, matches) in deltas.items():
+                self._track(chat_id, likes, matches)
+            raise
+
+    async def _save(self, touch: bool = True) -> None:
+        try:
+            await self.flush(touch)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("Не удалось сохранить очередь уведомлений: %s", exc)
+
+    async def _sync(self) -> None:
+        while True:
+            try:
+                await self.adopt()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Не удалось забрать очередь уведомлений: %s", exc)
+            await self._save()
+            await asyncio.sleep(settings.NOTIFY_FLUSH_SECONDS)
+
+    async def run(self) -> None:
+        """Фоновая отправка и запись очереди в базу; при отмене дописывает несохранённое."""
+        try:
+            await asyncio.gather(self._dispatch(), self._sync())
+        except asyncio.CancelledError:
+            await self._save()
+            raise
+
+
+notifications = NotificationDispatcher()
 
 
 async def start_bot() -> None:
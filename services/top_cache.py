@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from typing import List
+
+from sqlalchemy import select
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.user import User
+from schemas.user import TopUserRead
+from utils.s3 import build_photo_variants_bulk, full_urls
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class TopLikedCache:
+    """
+    Топ пользователей по входящим лайкам. Готовый ответ хранится в памяти
+    и пересобирается фоновой задачей раз в TOP_CACHE_REFRESH_SECONDS
+    по индексу ix_users_likes_received — запрос к /interactions/top в базу не ходит.
+    """
+
+    def __init__(self):
+        self._entries: List[TopUserRead] = []
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self._size = settings.TOP_CACHE_SIZE
+        self._interval = settings.TOP_CACHE_REFRESH_SECONDS
+        self._refreshed_at = 0.0
+
+    async def top(self) -> List[TopUserRead]:
+        if not self._loaded:
+            # Первый запрос до первого прогона фоновой задачи
+            async with self._lock:
+                if not self._loaded:
+                    await self.refresh()
+        return self._entries
+
+    async def refresh(self) -> None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User)
+                .where(User.likes_received_count > 0)
+                .order_by(User.likes_received_count.desc(), User.id.desc())
+                .limit(self._size)
+            )
+            users = result.scalars().all()
+            photos_by_user = await build_photo_variants_bulk([u.id for u in users], db)
+
+        self._entries = [
+            TopUserRead(
+                user_id=user.id,
+                first_name=user.first_name,
+                birthdate=user.birthdate,
+                gender=user.gender,
+                about=user.about,
+                telegram_username=user.telegram_username,
+                instagram_username=user.instagram_username,
+                photos=full_urls(photos_by_user[user.id]),
+                photo_variants=photos_by_user[user.id],
+                created_at=user.created_at,
+                likes_count=user.likes_received_count,
+            )
+            for user in users
+        ]
+        self._loaded = True
+        self._refreshed_at = time.time()
+
+    def invalidate(self, user_id: int) -> None:
+        """Профиль из топа изменился — следующий запрос пересоберёт ответ."""
+        if any(entry.user_id == user_id for entry in self._entries):
+            self._loaded = False
+
+    def clear(self) -> None:
+        self._entries = []
+        self._loaded = False
+
+    def metrics(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "age_seconds": round(time.time() - self._refreshed_at, 1) if self._loaded else None,
+        }
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Не удалось обновить топ по лайкам: %s", exc)
+            await asyncio.sleep(self._interval)
+
+
+top_liked_cache = TopLikedCache()
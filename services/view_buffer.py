@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from core.config import settings
+from core.database import AsyncSessionLocal, is_foreign_key_violation
+from models.feed_view import FeedView
+from models.user import User
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ViewEventBuffer:
+    """
+    Write-behind буфер просмотров анкет.
+
+    Эндпоинт только кладёт событие в ограниченную очередь в памяти. Фоновая
+    задача сворачивает пачку по парам и пишет её одним upsert'ом в агрегат
+    feed_views: как только набралось VIEW_BUFFER_BATCH_SIZE событий или прошло
+    VIEW_BUFFER_FLUSH_SECONDS с первого события пачки. При остановке приложения очередь дописывается.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[tuple[int, int, datetime]] = asyncio.Queue(
+            maxsize=settings.VIEW_BUFFER_MAX_SIZE
+        )
+        self._batch_size = settings.VIEW_BUFFER_BATCH_SIZE
+        self._interval = settings.VIEW_BUFFER_FLUSH_SECONDS
+        self._flushed = 0
+        self._batches = 0
+        self._errors = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+
+    async def enqueue(self, viewer_id: int, viewed_id: int) -> None:
+        # При переполнении очереди запрос ждёт свободного места (backpressure)
+        await self._queue.put((viewer_id, viewed_id, datetime.now(timezone.utc)))
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "flushed_events": self._flushed,
+            "flushed_batches": self._batches,
+            "flush_errors": self._errors,
+            "last_flush_ms": round(self._last_flush_ms, 2),
+            "max_flush_ms": round(self._max_flush_ms, 2),
+        }
+
+    async def _collect(self, batch: list[tuple[int, int, datetime]]) -> None:
+        """
+        Ждёт первое событие и добирает пачку до размера или таймаута.
+        Пачка наполняется на месте, чтобы при отмене ничего не потерялось.
+        """
+        batch.append(await self._queue.get())
+        deadline = time.monotonic() + self._interval
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    def _drain(self) -> list[tuple[int, int, datetime]]:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    @staticmethod
+    def _aggregate(batch: list[tuple[int, int, datetime]]) -> list[dict]:
+        """
+        Сворачивает пачку в одну строку на пару: INSERT ... ON CONFLICT
+        не может обновить одну и ту же строку дважды за выражение.
+        """
+        pairs: dict[tuple[int, int], list] = {}
+        for viewer_id, viewed_id, viewed_at in batch:
+            agg = pairs.get((viewer_id, viewed_id))
+            if agg is None:
+                pairs[(viewer_id, viewed_id)] = [1, viewed_at, viewed_at]
+            else:
+                agg[0] += 1
+                agg[1] = min(agg[1], viewed_at)
+                agg[2] = max(agg[2], viewed_at)
+        # Единый порядок ключей снижает риск взаимоблокировок между воркерами.
+        # id не передаётся: его выдаёт последовательность feed_views
+        return [
+            {
+                "viewer_id": viewer_id,
+                "viewed_id": viewed_id,
+                "view_count": count,
+                "created_at": first_at,
+                "last_viewed_at": last_at,
+            }
+            for (viewer_id, viewed_id), (count, first_at, last_at) in sorted(pairs.items())
+        ]
+
+    @staticmethod
+    async def _upsert(db, rows: list[dict]) -> None:
+        stmt = pg_insert(FeedView)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[FeedView.viewer_id, FeedView.viewed_id],
+            set_={
+                "view_count": FeedView.view_count + stmt.excluded.view_count,
+                "last_viewed_at": func.greatest(FeedView.last_viewed_at, stmt.excluded.last_viewed_at),
+            },
+        )
+        await db.execute(stmt, rows)
+
+    async def _write(self, batch: list[tuple[int, int, datetime]]) -> None:
+        rows = self._aggregate(batch)
+        async with AsyncSessionLocal() as db:
+            try:
+                await self._upsert(db, rows)
+                await db.commit()
+            except IntegrityError as exc:
+                # Одно событие с удалённым пользователем не должно ронять всю пачку;
+                # прочие нарушения повтором не лечатся
+                await db.rollback()
+                if not is_foreign_key_violation(exc):
+                    raise
+                ids = {r["viewer_id"] for r in rows} | {r["viewed_id"] for r in rows}
+                existing = set((await db.execute(select(User.id).where(User.id.in_(ids)))).scalars())
+                rows = [r for r in rows if r["viewer_id"] in existing and r["viewed_id"] in existing]
+                if rows:
+                    await self._upsert(db, rows)
+                await db.commit()
+
+    async def flush(self, batch: list[tuple[int, int, datetime]]) -> None:
+        if not batch:
+            return
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+        except Exception as exc:  # noqa: BLE001
+            self._errors += 1
+            logger.exception("Не удалось записать %d просмотров: %s", len(batch), exc)
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._flushed += len(batch)
+        self._batches += 1
+        self._last_flush_ms = elapsed_ms
+        self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+
+    async def run(self) -> None:
+        """Фоновый цикл сброса; при отмене дописывает всё, что осталось в очереди."""
+        batch: list[tuple[int, int, datetime]] = []
+        try:
+            while True:
+                await self._collect(batch)
+                await self.flush(batch)
+                batch = []
+        except asyncio.CancelledError:
+            await self.flush(batch + self._drain())
+            raise
+
+
+view_buffer = ViewEventBuffer()
@@ -0,0 +1,109 @@
+"""
+Микробенчмарк сжатия фото на одном ядре.
+
+    python -m utils.bench_images
+
+Сравнивает прежний путь (полное декодирование, поворот через поиск тега
+в ExifTags.TAGS, кодирование в исходном разрешении) с текущим: draft-декодирование
+JPEG, exif_transpose и уменьшение до MAX_SIDE перед кодированием.
+Отдельно — подготовка всех размерных вариантов. Печатает время и размер результата.
+"""
+import time
+from io import BytesIO
+
+from PIL import Image, ExifTags
+
+from utils.image_tools import (
+    MAX_SIDE,
+    PHOTO_VARIANTS,
+    compress_image_bytes,
+    compress_image_variants_timed,
+)
+
+ROUNDS = 5
+SIZES = [(4000, 3000), (8000, 6000)]  # 12 и 48 Мп
+
+
+def _make_photo(width: int, height: int) -> bytes:
+    """JPEG «как с телефона»: градиент с шумом и тегом Orientation=6."""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 12)
+    img = Image.merge("RGB", (
+        gradient,
+        Image.blend(gradient.rotate(90, expand=False), noise, 0.3),
+        gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT),
+    ))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buf = BytesIO()
+    img.save(buf, "JPEG", quality=92, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def _legacy_decode(data: bytes) -> Image.Image:
+    img = Image.open(BytesIO(data))
+    img.load()
+    exif = img._getexif()
+    if exif is not None:
+        orientation_key = next(key for key, val in ExifTags.TAGS.items() if val == 'Orientation')
+        orientation = exif.get(orientation_key)
+        if orientation == 3:
+            img = img.rotate(180, expand=True)
+        elif orientation == 6:
+            img = img.rotate(270, expand=True)
+        elif orientation == 8:
+            img = img.rotate(90, expand=True)
+    img.info.pop('exif', None)
+    return img
+
+
+def _legacy_encode(img: Image.Image, quality: int) -> bytes:
+    buf = BytesIO()
+    img.save(buf, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buf.getvalue()
+
+
+def _legacy_compress(data: bytes) -> int:
+    return len(_legacy_encode(_legacy_decode(data), 90))
+
+
+def _legacy_variants(data: bytes) -> int:
+    img = _legacy_decode(data)
+    total = 0
+    for max_side, quality in PHOTO_VARIANTS.values():
+        if max(img.size) > max_side:
+            img = img.copy()
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        total += len(_legacy_encode(img, quality))
+    return total
+
+
+def _compress(data: bytes) -> int:
+    return len(compress_image_bytes(data, quality=90)[0])
+
+
+def _variants(data: bytes) -> int:
+    return sum(len(body) for body in compress_image_variants_timed(data)[0].values())
+
+
+def _rate(label: str, func, data: bytes) -> None:
+    func(data)  # прогрев
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        size = func(data)
+    elapsed = time.perf_counter() - started
+    print(f"  {label}: {elapsed * 1000 / ROUNDS:.0f} ms/фото, {ROUNDS / elapsed:.1f} фото/с, {size / 1024:.0f} КБ")
+
+
+def main() -> None:
+    for width, height in SIZES:
+        data = _make_photo(width, height)
+        print(f"{width}x{height}, исходник {len(data) / 1024:.0f} КБ, MAX_SIDE={MAX_SIDE}")
+        _rate("одно фото, прежний путь", _legacy_compress, data)
+        _rate("одно фото, draft + downscale", _compress, data)
+        _rate("все варианты, прежний путь", _legacy_variants, data)
+        _rate("все варианты, draft + exif_transpose", _variants, data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Микробенчмарк проверки Telegram init_data на одном ядре.
+
+    python -m utils.bench_init_data
+
+Сравнивает прежнюю проверку (ключ HMAC выводится на каждый вызов),
+холодный путь verify_init_data (уникальные init_data, без попаданий в кэш)
+и тёплый путь (повтор уже проверенного init_data).
+"""
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from core.config import settings
+from core.security import _WEBAPP_SECRET, _init_data_cache, verify_init_data
+
+ROUNDS = 20_000
+
+
+def _sign(fields: dict) -> str:
+    data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    fields = dict(fields, hash=hmac.new(_WEBAPP_SECRET, data_check_string.encode(), hashlib.sha256).hexdigest())
+    return urlencode(fields)
+
+
+def _make_init_data(user_id: int) -> str:
+    user = {"id": user_id, "first_name": "Bench", "username": f"bench_{user_id}", "language_code": "ru"}
+    return _sign({
+        "query_id": f"AAH{user_id:012d}",
+        "user": json.dumps(user, separators=(",", ":")),
+        "auth_date": str(int(time.time())),
+    })
+
+
+def _legacy_verify(init_data: str) -> dict:
+    data = dict(parse_qsl(init_data, keep_blank_values=True))
+    hash_received = data.pop("hash")
+    data_check_string = "\n".join(f"{key}={data[key]}" for key in sorted(data.keys()))
+    secret_key = hmac.new(b"WebAppData", settings.TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).digest()
+    computed = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    assert hmac.compare_digest(computed, hash_received)
+    return data
+
+
+def _rate(label: str, func, payloads: list[str]) -> None:
+    started = time.perf_counter()
+    for payload in payloads:
+        func(payload)
+    elapsed = time.perf_counter() - started
+    print(f"{label}: {len(payloads) / elapsed:,.0f} logins/s ({elapsed * 1e6 / len(payloads):.1f} µs/login)")
+
+
+def main() -> None:
+    unique = [_make_init_data(100_000 + i) for i in range(ROUNDS)]
+    _rate("legacy (secret per call)", _legacy_verify, unique)
+
+    _init_data_cache.clear()
+    _rate("cold (precomputed secret)", verify_init_data, unique)
+
+    settings.INIT_DATA_MAX_REUSE = ROUNDS
+    repeated = [unique[0]] * ROUNDS
+    _rate("warm (replay cache hit)", verify_init_data, repeated)
+
+
+if __name__ == "__main__":
+    main()
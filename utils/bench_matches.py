@@ -0,0 +1,154 @@
+"""
+Бенчмарк /interactions/matches на засеянных данных.
+
+    python -m utils.bench_matches
+
+Создаёт BENCH_USERS пользователей, у каждого из первых BENCH_VIEWERS —
+BENCH_MATCHES_PER_USER матчей, и сравнивает:
+- старую схему: OR по обеим сторонам пары + загрузка всех собеседников;
+- ту же страницу через OR (ORDER BY ... LIMIT) — отдельно эффект UNION ALL;
+- fetch_matches: UNION ALL двух индексных веток, первая страница.
+Затем печатает EXPLAIN ANALYZE обоих запросов страницы. После замера данные удаляются.
+"""
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, insert, or_, case, text, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from core.database import AsyncSessionLocal
+from core.id_generator import generate_random_id
+from models.match import Match as MatchModel
+from models.user import User
+from repos.matches import fetch_matches, matches_page_stmt
+from utils.s3 import build_photo_urls_bulk
+
+BENCH_USERS = 5_000
+BENCH_VIEWERS = 20
+BENCH_MATCHES_PER_USER = 1_000
+PAGE_SIZE = 20
+ROUNDS = 20
+
+
+def _any_user(user_ids: list[int]):
+    """User.id = ANY(:ids): один параметр вместо IN-списка (у asyncpg лимит 32767)."""
+    return User.id == any_(bindparam("ids", user_ids, type_=ARRAY(BigInteger)))
+
+
+async def _seed() -> list[int]:
+    now = datetime.now(timezone.utc)
+    # Случайных id всего около миллиона — на тысячах пользователей они совпадают
+    user_ids = list(dict.fromkeys(generate_random_id("users") for _ in range(BENCH_USERS * 2)))[:BENCH_USERS]
+    async with AsyncSessionLocal() as db:
+        taken = set((await db.execute(select(User.id).where(_any_user(user_ids)))).scalars())
+    user_ids = [uid for uid in user_ids if uid not in taken]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {
+                "id": uid,
+                "telegram_user_id": -uid,
+                "first_name": "bench",
+                "gender": "female" if i % 2 else "male",
+                "created_at": now,
+            }
+            for i, uid in enumerate(user_ids)
+        ])
+        pairs: set[tuple[int, int]] = set()
+        for viewer_id in user_ids[:BENCH_VIEWERS]:
+            for other_id in random.sample(user_ids, BENCH_MATCHES_PER_USER + 1):
+                if other_id != viewer_id:
+                    pairs.add(tuple(sorted((viewer_id, other_id))))
+        # id матчей выдаёт последовательность
+        await db.execute(insert(MatchModel), [
+            {
+                "user1_id": user1_id,
+                "user2_id": user2_id,
+                "created_at": now - timedelta(seconds=random.randint(0, 90 * 86_400)),
+            }
+            for user1_id, user2_id in pairs
+        ])
+        await db.commit()
+    return user_ids
+
+
+async def _cleanup(user_ids: list[int]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(_any_user(user_ids)))
+        await db.commit()
+
+
+async def _legacy_matches(db, user_id: int) -> int:
+    matches = (await db.execute(
+        select(MatchModel).where(or_(MatchModel.user1_id == user_id, MatchModel.user2_id == user_id))
+    )).scalars().all()
+    other_ids = [m.user2_id if m.user1_id == user_id else m.user1_id for m in matches]
+    users = (await db.execute(select(User).where(User.id.in_(other_ids)))).scalars().all()
+    await build_photo_urls_bulk([u.id for u in users], db)
+    return len(users)
+
+
+def _or_page_stmt(user_id: int):
+    other_id = case((MatchModel.user1_id == user_id, MatchModel.user2_id), else_=MatchModel.user1_id)
+    return (
+        select(User, MatchModel.created_at, MatchModel.id)
+        .join(MatchModel, User.id == other_id)
+        .where(
+            or_(MatchModel.user1_id == user_id, MatchModel.user2_id == user_id),
+            User.first_name.is_not(None),
+        )
+        .order_by(MatchModel.created_at.desc(), MatchModel.id.desc())
+        .limit(PAGE_SIZE)
+    )
+
+
+async def _or_paged_matches(db, user_id: int) -> int:
+    rows = (await db.execute(_or_page_stmt(user_id))).all()
+    await build_photo_urls_bulk([user.id for user, _, _ in rows], db)
+    return len(rows)
+
+
+async def _paged_matches(db, user_id: int) -> int:
+    rows = await fetch_matches(db, user_id, PAGE_SIZE)
+    await build_photo_urls_bulk([user.id for user, _, _ in rows], db)
+    return len(rows)
+
+
+async def _measure(label: str, func, viewers: list[int]) -> None:
+    async with AsyncSessionLocal() as db:
+        await func(db, viewers[0])  # прогрев
+        started = time.perf_counter()
+        for i in range(ROUNDS):
+            rows = await func(db, viewers[i % len(viewers)])
+        elapsed_ms = (time.perf_counter() - started) * 1000 / ROUNDS
+    print(f"{label}: {elapsed_ms:.2f} ms/request, {rows} users in response")
+
+
+async def _explain(label: str, stmt) -> None:
+    async with AsyncSessionLocal() as db:
+        sql = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = (await db.execute(text(f"EXPLAIN (ANALYZE, COSTS OFF) {sql}"))).scalars().all()
+    print(f"\n{label}:")
+    print("\n".join(plan))
+
+
+async def main() -> None:
+    user_ids = await _seed()
+    viewers = user_ids[:BENCH_VIEWERS]
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("ANALYZE matches"))
+            await db.execute(text("ANALYZE users"))
+            await db.commit()
+        await _measure("OR + load all", _legacy_matches, viewers)
+        await _measure(f"OR, page of {PAGE_SIZE}", _or_paged_matches, viewers)
+        await _measure(f"UNION ALL, page of {PAGE_SIZE}", _paged_matches, viewers)
+        await _explain("OR, page", _or_page_stmt(viewers[0]))
+        await _explain("UNION ALL, page", matches_page_stmt(viewers[0], PAGE_SIZE))
+    finally:
+        await _cleanup(user_ids)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Проверка плана запроса кандидатов ленты на засеянных данных.
+
+    python -m utils.check_feed_plan
+
+Создаёт CHECK_USERS пользователей, каждый лайкает LIKES_PER_USER других,
+у каждого — около MATCHES_PER_USER матчей. После ANALYZE снимает EXPLAIN
+с feed_candidates_stmt (первая страница newest_first) для нескольких
+зрителей и падает с AssertionError, если в плане есть Seq Scan по likes
+или matches: анти-join'ы должны оставаться точечными поисками по индексам
+пар. После проверки данные удаляются.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, insert, text, any_, bindparam, BigInteger
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from core.database import AsyncSessionLocal
+from core.id_generator import generate_random_id
+from models.like import Like as LikeModel
+from models.match import Match as MatchModel
+from models.user import User
+from repos.feed import feed_candidates_stmt, newest_first
+
+CHECK_USERS = 5_000
+LIKES_PER_USER = 40
+MATCHES_PER_USER = 10
+CHECK_VIEWERS = 5
+PAGE_SIZE = 20
+FORBIDDEN = ("Seq Scan on likes", "Seq Scan on matches")
+
+
+def _any_user(user_ids: list[int]):
+    """User.id = ANY(:ids): один параметр вместо IN-списка (у asyncpg лимит 32767)."""
+    return User.id == any_(bindparam("ids", user_ids, type_=ARRAY(BigInteger)))
+
+
+async def _seed() -> list[int]:
+    now = datetime.now(timezone.utc)
+    # Случайных id всего около миллиона — на тысячах пользователей они совпадают
+    user_ids = list(dict.fromkeys(generate_random_id("users") for _ in range(CHECK_USERS * 2)))[:CHECK_USERS]
+    async with AsyncSessionLocal() as db:
+        taken = set((await db.execute(select(User.id).where(_any_user(user_ids)))).scalars())
+    user_ids = [uid for uid in user_ids if uid not in taken]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {
+                "id": uid,
+                "telegram_user_id": -uid,
+                "first_name": "plan",
+                "gender": "female" if i % 2 else "male",
+                "created_at": now - timedelta(seconds=i),
+            }
+            for i, uid in enumerate(user_ids)
+        ])
+        likes: set[tuple[int, int]] = set()
+        pairs: set[tuple[int, int]] = set()
+        for user_id in user_ids:
+            for other_id in random.sample(user_ids, LIKES_PER_USER):
+                if other_id != user_id:
+                    likes.add((user_id, other_id))
+            for other_id in random.sample(user_ids, MATCHES_PER_USER):
+                if other_id != user_id:
+                    pairs.add(tuple(sorted((user_id, other_id))))
+        # id лайков и матчей выдаёт последовательность
+        await db.execute(insert(LikeModel), [
+            {"liker_id": liker_id, "liked_id": liked_id, "created_at": now}
+            for liker_id, liked_id in likes
+        ])
+        await db.execute(insert(MatchModel), [
+            {"user1_id": user1_id, "user2_id": user2_id, "created_at": now}
+            for user1_id, user2_id in pairs
+        ])
+        await db.commit()
+    return user_ids
+
+
+async def _cleanup(user_ids: list[int]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(_any_user(user_ids)))
+        await db.commit()
+
+
+async def _explain(stmt) -> list[str]:
+    async with AsyncSessionLocal() as db:
+        sql = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+        return (await db.execute(text(f"EXPLAIN {sql}"))).scalars().all()
+
+
+async def main() -> None:
+    user_ids = await _seed()
+    try:
+        async with AsyncSessionLocal() as db:
+            for table in ("users", "likes", "matches"):
+                await db.execute(text(f"ANALYZE {table}"))
+            await db.commit()
+
+        for i, viewer_id in enumerate(user_ids[:CHECK_VIEWERS]):
+            gender = "female" if i % 2 else "male"
+            stmt = newest_first(feed_candidates_stmt(viewer_id, gender)).limit(PAGE_SIZE)
+            plan = await _explain(stmt)
+            bad = [line.strip() for line in plan if any(node in line for node in FORBIDDEN)]
+            assert not bad, f"зритель {viewer_id}: {bad}\n" + "\n".join(plan)
+            if i == 0:
+                print("\n".join(plan))
+    finally:
+        await _cleanup(user_ids)
+    print(f"ok: {CHECK_VIEWERS} зрителей, в планах нет {' / '.join(FORBIDDEN)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
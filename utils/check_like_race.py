@@ -0,0 +1,125 @@
+"""
+Проверка toggle_like под конкурентной нагрузкой на одну пару.
+
+    python -m utils.check_like_race
+
+Создаёт двух пользователей и ROUNDS раз шлёт по PER_SIDE лайков с каждой
+стороны одновременно, каждый в своей сессии и транзакции, как это делает
+/interactions/like. После каждого раунда проверяет:
+- у пары не больше одного лайка в каждую сторону и не больше одного матча;
+- матч есть тогда и только тогда, когда оба лайка на месте;
+- users.likes_received_count совпадает с числом лайков в таблице.
+Падает с AssertionError на первом нарушении. После проверки данные удаляются.
+Без advisory-lock пары в toggle_like проверка падает за несколько десятков
+раундов: оба лайка на месте, а матча нет.
+"""
+import asyncio
+from datetime import datetime, timezone
+
+from sqlalchemy import select, delete, insert, update, func
+
+from core.database import AsyncSessionLocal
+from core.id_generator import generate_random_id
+from models.like import Like as LikeModel
+from models.match import Match as MatchModel
+from models.user import User
+from repos.likes import toggle_like
+
+ROUNDS = 50
+PER_SIDE = 5  # нечётное: после раунда оба лайка должны стоять
+
+
+async def _seed() -> tuple[int, int]:
+    now = datetime.now(timezone.utc)
+    user_ids = [generate_random_id("users") for _ in range(2)]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [
+            {"id": uid, "telegram_user_id": -uid, "first_name": "race", "gender": gender, "created_at": now}
+            for uid, gender in zip(user_ids, ("male", "female"))
+        ])
+        await db.commit()
+    return user_ids[0], user_ids[1]
+
+
+async def _cleanup(user_ids: tuple[int, int]) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(User).where(User.id.in_(user_ids)))
+        await db.commit()
+
+
+async def _like(liker_id: int, liked_id: int) -> None:
+    async with AsyncSessionLocal() as db:
+        await toggle_like(db, liker_id, liked_id)
+        await db.commit()
+
+
+async def _reset(first_id: int, second_id: int) -> None:
+    """Раунд начинается с пары без лайков и матча."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(LikeModel).where(
+            LikeModel.liker_id.in_((first_id, second_id)),
+            LikeModel.liked_id.in_((first_id, second_id)),
+        ))
+        await db.execute(delete(MatchModel).where(
+            MatchModel.user1_id == min(first_id, second_id),
+            MatchModel.user2_id == max(first_id, second_id),
+        ))
+        await db.execute(
+            update(User)
+            .where(User.id.in_((first_id, second_id)))
+            .values(likes_received_count=0)
+        )
+        await db.commit()
+
+
+async def _check(first_id: int, second_id: int, round_no: int) -> bool:
+    async with AsyncSessionLocal() as db:
+        likes = dict((await db.execute(
+            select(LikeModel.liker_id, func.count())
+            .where(
+                LikeModel.liker_id.in_((first_id, second_id)),
+                LikeModel.liked_id.in_((first_id, second_id)),
+            )
+            .group_by(LikeModel.liker_id)
+        )).all())
+        matches = (await db.execute(
+            select(func.count()).select_from(MatchModel).where(
+                MatchModel.user1_id == min(first_id, second_id),
+                MatchModel.user2_id == max(first_id, second_id),
+            )
+        )).scalar_one()
+        counters = dict((await db.execute(
+            select(User.id, User.likes_received_count).where(User.id.in_((first_id, second_id)))
+        )).all())
+
+    forward, backward = likes.get(first_id, 0), likes.get(second_id, 0)
+    assert forward <= 1 and backward <= 1, f"раунд {round_no}: дубли лайков {likes}"
+    assert matches <= 1, f"раунд {round_no}: {matches} матчей у пары"
+    mutual = forward == 1 and backward == 1
+    assert matches == int(mutual), f"раунд {round_no}: лайки {likes}, матчей {matches}"
+    assert counters[second_id] == forward and counters[first_id] == backward, (
+        f"раунд {round_no}: счётчики {counters} не совпадают с лайками {likes}"
+    )
+    return mutual
+
+
+async def main() -> None:
+    first_id, second_id = await _seed()
+    mutual_rounds = 0
+    try:
+        for round_no in range(ROUNDS):
+            await _reset(first_id, second_id)
+            await asyncio.gather(*(
+                _like(liker_id, liked_id)
+                for _ in range(PER_SIDE)
+                for liker_id, liked_id in ((first_id, second_id), (second_id, first_id))
+            ))
+            mutual_rounds += await _check(first_id, second_id, round_no)
+        assert mutual_rounds == ROUNDS, f"матч создан только в {mutual_rounds} из {ROUNDS} раундов"
+    finally:
+        await _cleanup((first_id, second_id))
+    print(f"ok: {ROUNDS} раундов по {PER_SIDE} встречных лайков с каждой стороны")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
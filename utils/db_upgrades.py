@@ -0,0 +1,164 @@
+from sqlalchemy import text, select, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.id_generator import RANDOM_ID_CEILING
+from models.user import User
+from utils.geo import encode_geohash
+
+
+def _sequence_ids(table: str) -> str:
+    """
+    Гарантирует последовательность для {table}.id и сдвигает её выше диапазона
+    случайных id: строки, вставленные пачкой без id, не пересекутся со старыми.
+    """
+    return f"""
+    DO $$
+    DECLARE
+        seq text := pg_get_serial_sequence('{table}', 'id');
+    BEGIN
+        IF seq IS NULL THEN
+            CREATE SEQUENCE IF NOT EXISTS {table}_id_seq OWNED BY {table}.id;
+            ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq');
+            seq := '{table}_id_seq';
+        END IF;
+        IF COALESCE(pg_sequence_last_value(seq::regclass), 0) < {RANDOM_ID_CEILING} THEN
+            PERFORM setval(seq, GREATEST((SELECT COALESCE(max(id), 0) FROM {table}), {RANDOM_ID_CEILING}));
+        END IF;
+    END $$
+    """
+
+
+# Идемпотентные DDL для уже существующих баз.
+# create_all создаёт только отсутствующие таблицы, поэтому индексы и колонки,
+# добавленные в модели позже, докатываются здесь при старте приложения.
+SCHEMA_UPGRADES: list[str] = [
+    "CREATE INDEX IF NOT EXISTS ix_users_created_at_id ON users (created_at, id)",
+    # Перед созданием уникальных индексов убираем накопившиеся дубликаты пар
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('uq_likes_liker_liked') IS NULL THEN
+            DELETE FROM likes a USING likes b
+            WHERE a.liker_id = b.liker_id AND a.liked_id = b.liked_id AND a.id > b.id;
+        END IF;
+        IF to_regclass('uq_matches_user1_user2') IS NULL THEN
+            DELETE FROM matches a USING matches b
+            WHERE a.user1_id = b.user1_id AND a.user2_id = b.user2_id AND a.id > b.id;
+        END IF;
+    END $$
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_likes_liker_liked ON likes (liker_id, liked_id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_matches_user1_user2 ON matches (user1_id, user2_id)",
+    "CREATE INDEX IF NOT EXISTS ix_matches_user2_user1 ON matches (user2_id, user1_id)",
+    "CREATE INDEX IF NOT EXISTS ix_likes_liked_created ON likes (liked_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_photos_user_id ON photos (user_id)",
+    'ALTER TABLE users ADD COLUMN IF NOT EXISTS geohash varchar(12) COLLATE "C"',
+    "CREATE INDEX IF NOT EXISTS ix_users_geohash ON users (geohash)",
+    "CREATE INDEX IF NOT EXISTS ix_battles_winner_id ON battles (winner_id)",
+    # feed_views: построчный журнал просмотров → агрегат по паре (viewer, viewed)
+    "ALTER TABLE feed_views ADD COLUMN IF NOT EXISTS view_count integer NOT NULL DEFAULT 1",
+    "ALTER TABLE feed_views ADD COLUMN IF NOT EXISTS last_viewed_at timestamptz",
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('uq_feed_views_viewer_viewed') IS NULL THEN
+            UPDATE feed_views f
+            SET view_count = agg.view_count,
+                created_at = agg.first_viewed_at,
+                last_viewed_at = agg.last_viewed_at
+            FROM (
+                SELECT min(id) AS keep_id,
+                       count(*) AS view_count,
+                       min(created_at) AS first_viewed_at,
+                       max(created_at) AS last_viewed_at
+                FROM feed_views
+                GROUP BY viewer_id, viewed_id
+            ) agg
+            WHERE f.id = agg.keep_id;
+            DELETE FROM feed_views a USING feed_views b
+            WHERE a.viewer_id = b.viewer_id AND a.viewed_id = b.viewed_id AND a.id > b.id;
+            ALTER TABLE feed_views ALTER COLUMN last_viewed_at SET DEFAULT now();
+            ALTER TABLE feed_views ALTER COLUMN last_viewed_at SET NOT NULL;
+        END IF;
+    END $$
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_feed_views_viewer_viewed
+    ON feed_views (viewer_id, viewed_id)
+    """,
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS likes_received_count integer NOT NULL DEFAULT 0",
+    # Однократный пересчёт счётчиков по существующим лайкам
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('ix_users_likes_received') IS NULL THEN
+            UPDATE users u
+            SET likes_received_count = c.likes
+            FROM (SELECT liked_id, count(*) AS likes FROM likes GROUP BY liked_id) c
+            WHERE u.id = c.liked_id;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_users_likes_received ON users (likes_received_count, id)",
+    "CREATE INDEX IF NOT EXISTS ix_matches_user1_created ON matches (user1_id, created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_matches_user2_created ON matches (user2_id, created_at, id)",
+    "ALTER TABLE photos ADD COLUMN IF NOT EXISTS has_variants boolean NOT NULL DEFAULT false",
+    # Таблицы, куда строки пишутся пачками, берут id из последовательности
+    _sequence_ids("battles"),
+    _sequence_ids("likes"),
+    _sequence_ids("matches"),
+    _sequence_ids("feed_views"),
+    "ALTER TABLE battles ADD COLUMN IF NOT EXISTS country varchar(64)",
+    "ALTER TABLE battles ADD COLUMN IF NOT EXISTS city varchar(64)",
+    "ALTER TABLE battles ADD COLUMN IF NOT EXISTS district varchar(128)",
+    # Однократно: баттлам до появления колонок — текущий район победителя
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('ix_battles_location_winner') IS NULL THEN
+            UPDATE battles b
+            SET country = u.country, city = u.city, district = u.district
+            FROM users u
+            WHERE u.id = b.winner_id AND b.district IS NULL;
+        END IF;
+    END $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_battles_location_winner
+    ON battles (country, city, district, winner_id)
+    """,
+    "ALTER TABLE pending_notifications ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now()",
+]
+
+_BACKFILL_BATCH = 1000
+
+
+async def apply_schema_upgrades(conn: AsyncConnection) -> None:
+    for statement in SCHEMA_UPGRADES:
+        await conn.execute(text(statement))
+    await _backfill_geohash(conn)
+
+
+async def _backfill_geohash(conn: AsyncConnection) -> None:
+    """Проставляет geohash пользователям, у которых координаты были до появления колонки."""
+    while True:
+        rows = (await conn.execute(
+            select(User.id, User.latitude, User.longitude)
+            .where(
+                User.geohash.is_(None),
+                User.latitude.is_not(None),
+                User.longitude.is_not(None),
+            )
+            .limit(_BACKFILL_BATCH)
+        )).all()
+        if not rows:
+            return
+        await conn.execute(
+            update(User.__table__)
+            .where(User.__table__.c.id == bindparam("user_id"))
+            .values(geohash=bindparam("geohash")),
+            [
+                {"user_id": user_id, "geohash": encode_geohash(lat, lon)}
+                for user_id, lat, lon in rows
+            ],
+        )
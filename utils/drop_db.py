@@ -4,6 +4,7 @@ from sqlalchemy import text
 from core.config import settings
 
 from models.base import Base
+from utils.db_upgrades import apply_schema_upgrades
 
 
 async def async_drop_database():
@@ -20,6 +21,8 @@ async def async_drop_database():
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # Индексы и последовательности id выше диапазона случайных — как при старте
+        await apply_schema_upgrades(conn)
 
     await engine.dispose()
     print("⚠️ Схема public очищена и все таблицы созданы заново.")
\ No newline at end of file
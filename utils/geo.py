@@ -0,0 +1,98 @@
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_EARTH_RADIUS_KM = 6371.0088
+_KM_PER_DEGREE = math.pi * _EARTH_RADIUS_KM / 180
+
+# Точность, с которой geohash хранится в users.geohash (~5 м)
+GEOHASH_PRECISION = 9
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Кодирует координаты в geohash заданной длины."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_lo = mid
+            else:
+                bits <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_lo = mid
+            else:
+                bits <<= 1
+                lat_hi = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def _cell_size_degrees(precision: int) -> tuple[float, float]:
+    """(высота, ширина) ячейки geohash в градусах."""
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def precision_for_radius(latitude: float, cell_km: float) -> int:
+    """Максимальная длина префикса, при которой ячейка не меньше cell_km по обеим сторонам."""
+    lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_deg, lon_deg = _cell_size_degrees(precision)
+        height_km = lat_deg * _KM_PER_DEGREE
+        width_km = lon_deg * _KM_PER_DEGREE * lon_scale
+        if height_km >= cell_km and width_km >= cell_km:
+            return precision
+    return 1
+
+
+def ring_cells(latitude: float, longitude: float, precision: int, ring: int) -> set[str]:
+    """
+    Префиксы geohash кольца ring вокруг ячейки точки: ring=0 — сама ячейка,
+    ring=k — ячейки на расстоянии ровно k ячеек по сетке.
+    """
+    lat_deg, lon_deg = _cell_size_degrees(precision)
+    cells = set()
+    for i in range(-ring, ring + 1):
+        lat = latitude + i * lat_deg
+        if not -90.0 <= lat <= 90.0:
+            continue
+        for j in range(-ring, ring + 1):
+            if max(abs(i), abs(j)) != ring:
+                continue
+            lon = (longitude + j * lon_deg + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return cells
+
+
+def ring_radius_km(latitude: float, precision: int, ring: int) -> float:
+    """
+    Радиус круга, гарантированно покрытого кольцами 0..ring: точка лежит
+    где угодно в центральной ячейке, поэтому до края блока не меньше ring ячеек.
+    Ширина считается по самой дальней от экватора широте блока.
+    """
+    lat_deg, lon_deg = _cell_size_degrees(precision)
+    edge_lat = min(abs(latitude) + (ring + 1) * lat_deg, 90.0)
+    width_km = lon_deg * _KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+    return ring * min(lat_deg * _KM_PER_DEGREE, width_km)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по большому кругу в километрах."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * _EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -1,79 +1,218 @@
-# app/core/image_utils.py
-
-from PIL import Image, ExifTags, UnidentifiedImageError
+import os
+import tempfile
+import time
 from io import BytesIO
+from typing import BinaryIO, Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Размерные варианты фото: имя → (максимальная сторона в px, качество).
+# Порядок — от большего к меньшему: каждый следующий ужимается из предыдущего.
+PHOTO_VARIANTS: dict[str, tuple[int, int]] = {
+    "full": (2560, 90),
+    "card": (960, 82),
+    "thumb": (320, 75),
+}
+
+# Больше этого размера по длинной стороне фото не хранятся
+MAX_SIDE = PHOTO_VARIANTS["full"][0]
+
+# Источник изображения: байты, путь к файлу или открытый бинарный файл
+ImageSource = Union[bytes, str, BinaryIO]
 
 
 def compress_image_bytes(
-    data: bytes,
-    quality: int = 70
+    data: ImageSource,
+    quality: int = 70,
+    max_side: int = MAX_SIDE,
 ) -> tuple[bytes, str]:
+    """Как compress_image_bytes_timed, но без замеров по стадиям."""
+    compressed, ext, _ = compress_image_bytes_timed(data, quality, max_side)
+    return compressed, ext
+
+
+def compress_image_bytes_timed(
+    data: ImageSource,
+    quality: int = 70,
+    max_side: int = MAX_SIDE,
+) -> tuple[bytes, str, dict[str, float]]:
     """
-    Сжимает изображение в памяти под соцсети:
-    - Открывает любой поддерживаемый Pillow формат.
+    Сжимает изображение под соцсети:
+    - Открывает любой поддерживаемый Pillow формат (байты, путь или файл).
+    - JPEG декодирует сразу в уменьшенном масштабе (draft), если исходник
+      как минимум вдвое больше max_side.
+    - Уменьшает до max_side по длинной стороне до поворота и кодирования.
     - Корректирует ориентацию по EXIF (удаляет EXIF после поворота).
     - Конвертирует в RGB, чтобы убрать альфа-канал.
     - Сохраняет в WebP, если исходный формат WebP, иначе в JPEG.
     - Качество по умолчанию снижено до 70 для агрессивного сжатия.
 
-    Возвращает (compressed_bytes, ext), где ext — "webp" или "jpg".
+    Возвращает (compressed_bytes, ext, timings), где ext — "webp" или "jpg",
+    а timings — длительность стадий decode/resize/rotate/encode в миллисекундах.
     Бросает ValueError, если файл не распознан как изображение.
+
+    Функция самодостаточна (только Pillow), чтобы её можно было выполнять
+    в отдельном процессе (services.image_pool).
+    """
+    timings: dict[str, float] = {}
+    img, orig_fmt = _decode_and_orient(data, timings, max_side)
+
+    started = time.perf_counter()
+    compressed, ext = _encode(img, orig_fmt, quality)
+    timings["encode"] = (time.perf_counter() - started) * 1000
+
+    return compressed, ext, timings
+
+
+def compress_image_variants_timed(
+    data: ImageSource,
+) -> tuple[dict[str, bytes], str, dict[str, float]]:
+    """
+    Готовит все варианты PHOTO_VARIANTS за одно декодирование исходника.
+
+    Возвращает ({variant: bytes}, ext, timings); encode в timings — суммарное
+    время уменьшения и кодирования всех вариантов.
+    Бросает ValueError, если файл не распознан как изображение.
+    """
+    timings: dict[str, float] = {}
+    img, orig_fmt = _decode_and_orient(data, timings, MAX_SIDE)
+
+    started = time.perf_counter()
+    variants: dict[str, bytes] = {}
+    ext = "jpg"
+    for name, resized in _resized_variants(img):
+        variants[name], ext = _encode(resized, orig_fmt, PHOTO_VARIANTS[name][1], name == "full")
+    timings["encode"] = (time.perf_counter() - started) * 1000
+
+    return variants, ext, timings
+
+
+def compress_image_variants_to_files(
+    src_path: str,
+) -> tuple[dict[str, str], str, dict[str, float]]:
     """
+    Как compress_image_variants_timed, но читает исходник с диска и пишет
+    каждый вариант сразу во временный файл: результат не гоняется между
+    процессами и не держится в памяти целиком.
+
+    Возвращает ({variant: путь}, ext, timings); файлы удаляет вызывающий код.
+    """
+    timings: dict[str, float] = {}
+    img, orig_fmt = _decode_and_orient(src_path, timings, MAX_SIDE)
+
+    started = time.perf_counter()
+    paths: dict[str, str] = {}
+    ext = "jpg"
+    try:
+        for name, resized in _resized_variants(img):
+            fd, path = tempfile.mkstemp(prefix=f"photo_{name}_")
+            paths[name] = path
+            with os.fdopen(fd, "wb") as out:
+                ext = _save(resized, out, orig_fmt, PHOTO_VARIANTS[name][1], name == "full")
+    except BaseException:
+        for path in paths.values():
+            os.unlink(path)
+        raise
+    timings["encode"] = (time.perf_counter() - started) * 1000
+
+    return paths, ext, timings
+
+
+def _resized_variants(img: Image.Image):
+    """Пары (variant, изображение) от большего варианта к меньшему."""
+    for name, (max_side, _) in PHOTO_VARIANTS.items():
+        img = _downscale(img, max_side)
+        yield name, img
+
+
+def _downscale(img: Image.Image, max_side: int) -> Image.Image:
+    """Копия, уменьшенная до max_side по длинной стороне; меньшие изображения — как есть."""
+    if max(img.size) <= max_side:
+        return img
+    img = img.copy()
+    # thumbnail сохраняет пропорции и только уменьшает; при большом коэффициенте
+    # reducing_gap сначала ужимает целочисленным reduce(). BICUBIC заметно
+    # дешевле LANCZOS на многомегапиксельных кадрах при той же резкости превью
+    img.thumbnail((max_side, max_side), Image.Resampling.BICUBIC, reducing_gap=2.0)
+    return img
+
+
+def _decode_and_orient(
+    data: ImageSource,
+    timings: dict[str, float],
+    max_side: int | None = None,
+) -> tuple[Image.Image, str]:
+    """
+    Декодирует, приводит к RGB и поворачивает по EXIF; пишет стадии decode/resize/rotate.
+    С max_side JPEG декодируется через draft в масштабе 1/2–1/8, но не меньше
+    max_side по длинной стороне, и сразу уменьшается до max_side — поворот
+    и всё дальнейшее работают уже с малой картинкой.
+    """
+    started = time.perf_counter()
     try:
-        img = Image.open(BytesIO(data))
-    except UnidentifiedImageError:
+        img = Image.open(BytesIO(data) if isinstance(data, (bytes, bytearray)) else data)
+        # Сохраняем исходный формат до поворота и конвертации
+        orig_fmt = (img.format or 'JPEG').upper()
+        if max_side and orig_fmt == 'JPEG' and max(img.size) >= 2 * max_side:
+            ratio = max_side / max(img.size)
+            img.draft(None, (max(1, round(img.width * ratio)), max(1, round(img.height * ratio))))
+        # open() ленивый — декодируем явно, чтобы стадия измерялась честно
+        img.load()
+    except (UnidentifiedImageError, OSError):
         raise ValueError("Неподдерживаемый файл — это не изображение")
+    timings["decode"] = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    # Конвертируем в RGB до уменьшения: палитровые картинки resize
+    # масштабирует только NEAREST, а заодно убираем альфа-канал
+    if img.mode in ('RGBA', 'P'):
+        img = img.convert('RGB')
+    if max_side:
+        # Рамка квадратная, поэтому уменьшать можно до поворота
+        img = _downscale(img, max_side)
+    timings["resize"] = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
 
-    # Пытаться получить EXIF и корректировать ориентацию
+    # Поворот по тегу Orientation (все 8 вариантов, включая отражения)
     try:
-        exif = img._getexif()
-        if exif is not None:
-            # ищем тег ориентации
-            orientation_key = next(
-                key for key, val in ExifTags.TAGS.items() if val == 'Orientation'
-            )
-            orientation = exif.get(orientation_key)
-            if orientation == 3:
-                img = img.rotate(180, expand=True)
-            elif orientation == 6:
-                img = img.rotate(270, expand=True)
-            elif orientation == 8:
-                img = img.rotate(90, expand=True)
+        ImageOps.exif_transpose(img, in_place=True)
     except Exception:
-        # если EXIF не читается или нет ориентации — пропускаем
+        # если EXIF не читается — оставляем как есть
         pass
 
     # Очищаем EXIF, чтобы не передавать метаданные дальше
-    if hasattr(img, 'info') and 'exif' in img.info:
-        img.info.pop('exif')
+    img.info.pop('exif', None)
+    timings["rotate"] = (time.perf_counter() - started) * 1000
 
-    # Сохраняем исходный формат до возможной конвертации
-    orig_fmt = (img.format or 'JPEG').upper()
+    return img, orig_fmt
 
-    # Конвертируем в RGB, чтобы убрать альфа-канал
-    if img.mode in ('RGBA', 'P'):
-        img = img.convert('RGB')
 
+def _encode(img: Image.Image, orig_fmt: str, quality: int, progressive: bool = True) -> tuple[bytes, str]:
     buf = BytesIO()
+    ext = _save(img, buf, orig_fmt, quality, progressive)
+    return buf.getvalue(), ext
 
+
+def _save(img: Image.Image, out: BinaryIO, orig_fmt: str, quality: int, progressive: bool = True) -> str:
     # Если исходник был WebP, сохраняем в WebP
     if orig_fmt == 'WEBP':
         img.save(
-            buf,
+            out,
             'WEBP',
             quality=quality,
             optimize=True
         )
         ext = 'webp'
     else:
-        # Сохраняем в JPEG для всех остальных форматов
+        # Сохраняем в JPEG для всех остальных форматов. Progressive вдвое
+        # дороже при кодировании и нужен только крупным кадрам (постепенная
+        # прорисовка), превью card/thumb пишутся baseline
         img.save(
-            buf,
+            out,
             'JPEG',
             quality=quality,
             optimize=True,
-            progressive=True
+            progressive=progressive
         )
         ext = 'jpg'
 
-    return buf.getvalue(), ext
+    return ext
@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+# Заголовок, в котором отдаётся курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Упаковывает ключ последней строки страницы (created_at, id)
+    в непрозрачную для клиента строку.
+    """
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Обратная операция к encode_cursor.
+    Бросает HTTPException(400), если курсор повреждён.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор",
+        )
+
+
+def encode_distance_cursor(distance_km: float, row_id: int) -> str:
+    """Курсор ленты по расстоянию: ключ последней строки (distance_km, id)."""
+    raw = json.dumps([distance_km, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_distance_cursor(cursor: str) -> tuple[float, int]:
+    """
+    Обратная операция к encode_distance_cursor.
+    Бросает HTTPException(400), если курсор повреждён.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        distance_km, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(distance_km), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный курсор",
+        )
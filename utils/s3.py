@@ -1,15 +1,20 @@
+import os
 import uuid
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
+from typing import Iterable, Optional
 
 from minio import Minio
+from minio.datatypes import PostPolicy
 from minio.error import S3Error
 
-from sqlalchemy import select
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import settings
 from models.photo import Photo
-from utils.image_tools import compress_image_bytes
+from utils.image_tools import compress_image_bytes, PHOTO_VARIANTS
 
 _endpoint = settings.AWS_S3_ENDPOINT_URL.replace("https://", "").replace("http://", "")
 _s3 = Minio(
@@ -19,6 +24,20 @@ _s3 = Minio(
     region=settings.AWS_S3_REGION,
     secure=False
 )
+# Подписанные ссылки отдаются клиенту, поэтому схема — как у публичного адреса.
+# При заданном region подпись считается локально, без запросов к S3
+_presign_s3 = Minio(
+    _endpoint,
+    access_key=settings.AWS_ACCESS_KEY_ID,
+    secret_key=settings.AWS_SECRET_ACCESS_KEY,
+    region=settings.AWS_S3_REGION,
+    secure=settings.AWS_S3_ENDPOINT_URL.startswith("https://")
+)
+
+# Префикс и бакет, куда клиент сам загружает исходники по подписанной форме.
+# Бакет для исходников лучше держать приватным (S3_STAGING_BUCKET)
+STAGING_PREFIX = "staging"
+STAGING_BUCKET = settings.S3_STAGING_BUCKET or settings.AWS_S3_BUCKET_NAME
 
 
 def upload_file_to_s3(
@@ -30,26 +49,111 @@ def upload_file_to_s3(
     Сжимает изображение через compress_image_bytes и кладёт в S3.
     Бросает ValueError, если файл не изображение.
     Бросает Exception, если проблемы с S3.
+
+    Синхронный путь для скриптов; обработчики запросов используют
+    services.image_pool.upload_image.
     """
-    data = file_like.read()
+    # Pillow читает файл сам — без промежуточной копии всех байтов
+    compressed_data, ext = compress_image_bytes(file_like, quality=90)
 
-    compressed_data, ext = compress_image_bytes(data, quality=90)
+    s3_key = build_image_key(file_name, ext)
+    put_image_to_s3(compressed_data, s3_key, ext, bucket_name)
+    return s3_key
 
-    s3_key = f"profiles/{file_name}_{uuid.uuid4().hex}.{ext}"
 
-    # 4) заливаем в S3/MinIO
+def build_image_key(file_name: str, ext: str) -> str:
+    return f"profiles/{file_name}_{uuid.uuid4().hex}.{ext}"
+
+
+def put_image_to_s3(data: bytes, s3_key: str, ext: str, bucket_name: str) -> None:
+    """Кладёт готовые байты изображения в S3/MinIO."""
     try:
         _s3.put_object(
             bucket_name,
             s3_key,
-            BytesIO(compressed_data),
-            length=len(compressed_data),
+            BytesIO(data),
+            length=len(data),
             content_type=f"image/{ext}"
         )
     except S3Error as e:
         raise Exception(f"Ошибка при загрузке в S3: {e}")
 
-    return s3_key
+
+def put_file_to_s3(path: str, s3_key: str, ext: str, bucket_name: str) -> None:
+    """
+    Кладёт файл с диска в S3/MinIO. Файлы больше S3_PART_SIZE уходят
+    multipart-загрузкой по одной части за раз, так что в памяти
+    держится не больше одной части.
+    """
+    try:
+        with open(path, "rb") as f:
+            _s3.put_object(
+                bucket_name,
+                s3_key,
+                f,
+                length=os.path.getsize(path),
+                content_type=f"image/{ext}",
+                part_size=settings.S3_PART_SIZE,
+                num_parallel_uploads=1,
+            )
+    except S3Error as e:
+        raise Exception(f"Ошибка при загрузке в S3: {e}")
+
+
+def staging_key(user_id: int) -> str:
+    return f"{STAGING_PREFIX}/{user_id}/{uuid.uuid4().hex}"
+
+
+def presigned_post_form(
+    s3_key: str,
+    bucket_name: str,
+    expires_seconds: int,
+    max_bytes: int,
+) -> tuple[str, dict[str, str]]:
+    """
+    Подписанная форма для POST объекта напрямую в S3/MinIO.
+    Политика фиксирует ключ, ограничивает размер 1..max_bytes и требует
+    Content-Type image/*: остальное S3 отклонит сам.
+    Возвращает URL формы и поля, которые клиент отправляет перед файлом.
+    """
+    policy = PostPolicy(bucket_name, datetime.now(timezone.utc) + timedelta(seconds=expires_seconds))
+    policy.add_equals_condition("key", s3_key)
+    policy.add_starts_with_condition("Content-Type", "image/")
+    policy.add_content_length_range_condition(1, max_bytes)
+    fields = _presign_s3.presigned_post_policy(policy)
+    fields["key"] = s3_key
+    scheme = "https" if settings.AWS_S3_ENDPOINT_URL.startswith("https://") else "http"
+    return f"{scheme}://{_endpoint}/{bucket_name}", fields
+
+
+def list_stale_objects(prefix: str, bucket_name: str, older_than: datetime) -> list[str]:
+    """Ключи объектов под prefix, изменённых раньше older_than."""
+    try:
+        return [
+            obj.object_name
+            for obj in _s3.list_objects(bucket_name, prefix=f"{prefix}/", recursive=True)
+            if obj.last_modified is not None and obj.last_modified < older_than
+        ]
+    except S3Error as e:
+        raise Exception(f"Ошибка при чтении из S3: {e}")
+
+
+def stat_object_size(s3_key: str, bucket_name: str) -> Optional[int]:
+    """Размер объекта в байтах или None, если объекта нет."""
+    try:
+        return _s3.stat_object(bucket_name, s3_key).size
+    except S3Error as e:
+        if e.code in ("NoSuchKey", "NoSuchObject"):
+            return None
+        raise Exception(f"Ошибка при чтении из S3: {e}")
+
+
+def download_from_s3(s3_key: str, bucket_name: str, path: str) -> None:
+    """Скачивает объект в файл потоково, не держа его в памяти."""
+    try:
+        _s3.fget_object(bucket_name, s3_key, path)
+    except S3Error as e:
+        raise Exception(f"Ошибка при чтении из S3: {e}")
 
 
 def delete_file_from_s3(s3_key: str, bucket_name: str) -> None:
@@ -62,17 +166,87 @@ def delete_file_from_s3(s3_key: str, bucket_name: str) -> None:
         raise Exception(f"Ошибка при удалении из S3: {e}")
 
 
+def variant_key(s3_key: str, variant: str) -> str:
+    """Ключ размерного варианта: profiles/x_<uuid>.jpg → profiles/x_<uuid>_thumb.jpg; full — исходный ключ."""
+    if variant == "full":
+        return s3_key
+    stem, dot, ext = s3_key.rpartition(".")
+    return f"{stem}_{variant}.{ext}" if dot else f"{s3_key}_{variant}"
+
+
+def photo_variant_urls(s3_key: str, has_variants: bool, base: str | None = None) -> dict[str, str]:
+    """
+    URL всех вариантов фото. У фото, загруженных до появления вариантов,
+    все размеры указывают на единственный файл.
+    """
+    base = base or _public_base_url()
+    return {
+        variant: f"{base}/{variant_key(s3_key, variant) if has_variants else s3_key}"
+        for variant in PHOTO_VARIANTS
+    }
+
+
+def full_urls(variants: list[dict[str, str]]) -> list[str]:
+    return [v["full"] for v in variants]
+
+
 async def build_photo_urls(user_id: int, db: AsyncSession) -> list[str]:
     """
     Собирает публичные URL всех фото профиля.
     Сигнатура и поведение совпадают с прежней функцией.
     """
+    return full_urls(await build_photo_variants(user_id, db))
+
+
+async def build_photo_variants(user_id: int, db: AsyncSession) -> list[dict[str, str]]:
+    """Как build_photo_urls, но для каждого фото — словарь {thumb, card, full}."""
     result = await db.execute(
-        select(Photo.s3_key)
+        select(Photo.s3_key, Photo.has_variants)
         .where(Photo.user_id == user_id)
         .order_by(Photo.created_at.asc())
     )
-    keys = [row[0] for row in result.all()]
+    base = _public_base_url()
+    return [photo_variant_urls(key, has_variants, base) for key, has_variants in result.all()]
+
+
+async def build_photo_urls_bulk(
+    user_ids: Iterable[int],
+    db: AsyncSession,
+) -> dict[int, list[str]]:
+    """
+    Собирает URL фото сразу для нескольких пользователей одним запросом.
+    Возвращает {user_id: [url, ...]} с тем же порядком фото, что и build_photo_urls;
+    для пользователей без фото — пустой список.
+    """
+    variants = await build_photo_variants_bulk(user_ids, db)
+    return {user_id: full_urls(photos) for user_id, photos in variants.items()}
+
+
+async def build_photo_variants_bulk(
+    user_ids: Iterable[int],
+    db: AsyncSession,
+) -> dict[int, list[dict[str, str]]]:
+    """Как build_photo_urls_bulk, но для каждого фото — словарь {thumb, card, full}."""
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+
+    result = await db.execute(
+        select(
+            Photo.user_id,
+            func.array_agg(aggregate_order_by(Photo.s3_key, Photo.created_at.asc())),
+            func.array_agg(aggregate_order_by(Photo.has_variants, Photo.created_at.asc())),
+        )
+        .where(Photo.user_id.in_(ids))
+        .group_by(Photo.user_id)
+    )
+
+    base = _public_base_url()
+    photos: dict[int, list[dict[str, str]]] = {uid: [] for uid in ids}
+    for user_id, keys, flags in result.all():
+        photos[user_id] = [photo_variant_urls(key, flag, base) for key, flag in zip(keys, flags)]
+    return photos
+
 
-    base = settings.AWS_S3_ENDPOINT_URL.rstrip("/") + "/" + settings.AWS_S3_BUCKET_NAME
-    return [f"{base}/{key}" for key in keys]
+def _public_base_url() -> str:
+    return settings.AWS_S3_ENDPOINT_URL.rstrip("/") + "/" + settings.AWS_S3_BUCKET_NAME
@@ -0,0 +1,98 @@
+import os
+import tempfile
+from typing import BinaryIO
+
+from fastapi import HTTPException, UploadFile, status
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import settings
+
+# Размер куска при копировании загрузки на диск
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Файл слишком большой, максимум {max_bytes // (1024 * 1024)} МБ",
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Ограничивает размер multipart-запросов до разбора формы.
+
+    Заявленный Content-Length сверх лимита отклоняется сразу, без чтения тела;
+    тело без длины (chunked) считается по мере поступления, и запрос
+    обрывается с 413, как только лимит превышен.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        declared = headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > self.max_bytes:
+            exc = _too_large(self.max_bytes)
+            response = JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Поднимается из разбора формы и превращается в ответ 413
+                    raise _too_large(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def check_upload_size(upload: UploadFile) -> None:
+    """Отклоняет файл больше UPLOAD_MAX_FILE_BYTES, не читая его."""
+    if upload.size is not None and upload.size > settings.UPLOAD_MAX_FILE_BYTES:
+        raise _too_large(settings.UPLOAD_MAX_FILE_BYTES)
+
+
+def spool_to_disk(file_like: BinaryIO, max_bytes: int | None = None) -> str:
+    """
+    Копирует загрузку во временный файл кусками через один буфер и
+    возвращает путь. Файл удаляет вызывающий код.
+    Бросает HTTPException 413, если данных больше max_bytes.
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_FILE_BYTES
+    buf = bytearray(_CHUNK_SIZE)
+    view = memoryview(buf)
+    total = 0
+    file_like.seek(0)
+    fd, path = tempfile.mkstemp(prefix="upload_")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                read = file_like.readinto(buf)
+                if not read:
+                    break
+                total += read
+                if total > max_bytes:
+                    raise _too_large(max_bytes)
+                out.write(view[:read])
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path